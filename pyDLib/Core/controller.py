@@ -2,10 +2,13 @@
 import json
 import logging
 import os
+import threading
+import time
+import weakref
 from typing import Dict, Type, List, Optional
 
 from . import data_model, groups, formats, sql, threads, security
-from . import init_all, StructureError
+from . import init_all, StructureError, ConnexionError
 
 
 class Callbacks:
@@ -18,6 +21,150 @@ class Callbacks:
         return f
 
 
+class WriteBehindQueue:
+    """Opt-in alternative to executing `acces.save()` after each validation.
+    Modifications are merged by (table, Id) and saved later, in one transaction.
+    Queued modifications are applied to the in-memory base right away, so the GUI shows them.
+    Only acces of existing rows (with Id) of dict tables are supported.
+    """
+
+    def __init__(self, on_error=None, on_done=None, delay=None):
+        """
+        :param on_error: callback str -> None
+        :param on_done: callback list of results -> None
+        :param delay: If given, seconds after the first pending modification before an automatic flush.
+            The automatic flush is a background flush (see flush), so with Qt threads, callbacks are
+            called in the GUI thread. Without (dummy threads), it runs in a timer thread.
+        """
+        self.on_error = on_error or (lambda s: logging.error(s))
+        self.on_done = on_done or (lambda r: None)
+        self.delay = delay
+        self.pending = {}  # (table, Id) -> (acces, modifications)
+        self._lock = threading.Lock()
+        self._scheduled = False  # an automatic flush is waiting
+        self._thread = None
+        self._collections = []  # weak references on open collections, see watch
+        self._flush_lock = threading.Lock()  # held while a flush is saving
+        self._in_flight = False  # a background flush is running
+        self._flush_again = None  # delay of a flush requested while a background flush was running
+
+    def __len__(self):
+        return len(self.pending)
+
+    def watch(self, collection: groups.Collection):
+        """Register an open collection : its cached sort keys (and search snapshot) are
+        invalidated for each queued row. Only a weak reference is kept."""
+        self._collections = [r for r in self._collections if r() is not None and r() is not collection]
+        self._collections.append(weakref.ref(collection))
+
+    def add(self, acces: data_model.abstractAcces):
+        """Move acces modifications in the queue."""
+        if acces.Id is None:
+            raise ValueError("Only existing rows can be queued !")
+        modifications = dict(acces.modifications)
+        acces.modifications.clear()
+        table = getattr(acces.base, acces.TABLE)
+        table[acces.Id].update(modifications)
+        table.refresh_indexes(acces.Id)
+        for ref in self._collections:
+            collection = ref()
+            if collection is not None:
+                collection.invalidate_sort_keys(acces.Id)
+        with self._lock:
+            key = (acces.TABLE, acces.Id)
+            _, current = self.pending.get(key, (None, {}))
+            self.pending[key] = (acces, dict(current, **modifications))
+            schedule = self.delay is not None and not self._scheduled
+            self._scheduled = self._scheduled or schedule
+        if schedule:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if getattr(threads, "THREAD", threads.dummyThread) is threads.dummyThread:
+            # dummy threads run synchronously : add must not wait
+            timer = threading.Timer(self.delay, self.flush)
+            timer.daemon = True
+            timer.start()
+        else:
+            self.flush(delay=self.delay)
+
+    def _take_pending(self):
+        with self._lock:
+            pending, self.pending = self.pending, {}
+            self._scheduled = False
+        return pending
+
+    def _restore_pending(self, pending):
+        """Put back modifications which failed, under newer ones"""
+        with self._lock:
+            for key, (acces, modifications) in pending.items():
+                _, newer = self.pending.get(key, (None, {}))
+                self.pending[key] = (acces, dict(modifications, **newer))
+
+    def _execute(self):
+        """Take pending modifications and save them. Returns None if there is nothing to save.
+        Executions are serialized by _flush_lock : older modifications are always committed first."""
+        with self._flush_lock:
+            pending = self._take_pending()
+            if not pending:
+                return None
+            requetes = sql.Executant()
+            for acces, modifications in pending.values():
+                requetes += acces._dict_to_SQL(modifications)
+            try:
+                return requetes()
+            except (ConnexionError, StructureError):
+                self._restore_pending(pending)  # before any other flush may take newer modifications
+                raise
+
+    def flush(self, background=True, delay=0):
+        """Save pending modifications in one transaction. Only one flush runs at a time.
+        If background, the request is run in a thread (see threads.worker), after waiting delay seconds,
+        and nothing is returned.
+        If a background flush is already running, modifications are saved by a new one when it's done.
+        Otherwise, returns the results (on_done is called as well). On failure, modifications are kept in the queue."""
+        if background:
+            if self._in_flight:
+                self._flush_again = delay if self._flush_again is None else min(delay, self._flush_again)
+                return
+            if not self.pending:
+                return
+            self._in_flight = True
+
+            def job():
+                time.sleep(delay)
+                return self._execute()
+
+            thread = threads.worker(job, self._on_background_error, self._on_background_done)
+            if self._in_flight:  # keeps a reference on the running thread
+                self._thread = thread
+            return
+        try:
+            res = self._execute()
+        except (ConnexionError, StructureError) as e:
+            self.on_error(str(e))
+        else:
+            if res is not None:
+                self.on_done(res)
+            return res
+
+    def _background_finished(self):
+        self._in_flight = False
+        self._thread = None
+        if self._flush_again is not None:
+            delay, self._flush_again = self._flush_again, None
+            self.flush(background=True, delay=delay)
+
+    def _on_background_done(self, res):
+        if res is not None:
+            self.on_done(res)
+        self._background_finished()
+
+    def _on_background_error(self, msg):
+        self.on_error(msg)
+        self._background_finished()
+
+
 class abstractInterface:
     """Base class for the main driver of the application. GUI parts will register callbacks through
     set_callback, add_reset_function, add_update_function.
@@ -35,6 +182,9 @@ class abstractInterface:
     TABLE: Optional[str] = None
     """Default table used to build main collection (through get_all)"""
 
+    SEARCH_EXECUTOR = None
+    """Optionnal concurrent.futures.ProcessPoolExecutor used to search in large collections"""
+
     base: data_model.abstractBase
     collection: groups.Collection
     main: 'abstractInterInterfaces'
@@ -61,6 +211,7 @@ class abstractInterface:
 
         self.threads = []  # Active threads
 
+        self.search_session = groups.SearchSession(self.get_all)
         self.collection = self.get_all()
 
     def reset(self):
@@ -69,9 +220,12 @@ class abstractInterface:
 
     def update(self):
         self._update_data()
+        self.collection.invalidate_sort_keys()
+        self.search_session.reset()
         self._update_render()
 
     def _reset_data(self):
+        self.search_session.reset()
         self.collection = self.get_all()
 
     def _update_data(self):
@@ -119,10 +273,11 @@ class abstractInterface:
     def recherche(self, pattern, entete, in_all=False):
         """abstractSearch in fields of collection and reset rendering.
         Returns number of results.
-        If in_all is True, call get_all before doing the search."""
+        If in_all is True, search in get_all(), or in the previous results if the pattern refines the previous one."""
         if in_all:
-            self.collection = self.get_all()
-        self.collection.recherche(pattern, entete)
+            self.collection = self.search_session.recherche(pattern, entete, executor=self.SEARCH_EXECUTOR)
+        else:
+            self.collection.recherche(pattern, entete, executor=self.SEARCH_EXECUTOR)
         self._reset_render()
         return len(self.collection)
 
@@ -244,16 +399,28 @@ class abstractInterInterfaces:
             json.dump(self.preferences, f, cls=formats.JsonEncoder)
         logging.info(f"Preference {key} updated.")
 
-    def load_remote_data(self, callback_etat=print):
+    def load_remote_data(self, callback_etat=print, incremental=False):
         """
         Load remote data. On succes, build base.
         On failure, raise :class:`~.Core.exceptions.StructureError`, :class:`~.Core.exceptions.ConnexionError`
 
         :param callback_etat: State renderer str , int , int -> None
+        :param incremental: If True and a base is already loaded, only fetch modified rows
+        If the base class defines a replica (see REPLICA_SCHEME), the base is loaded from it
+        and only modified rows are fetched.
         """
         callback_etat("Chargement des utilisateurs", 0, 1)
+        if sql.QUERY_CACHE is not None:
+            sql.QUERY_CACHE.invalidate()
         self._load_users()
-        self.base = self.BASE_CLASS.load_from_db(callback_etat=callback_etat)
+        if self.BASE_CLASS.REPLICA_SCHEME is not None:
+            if self.base is None:
+                self.base = self.BASE_CLASS.load_from_replica()
+            self.base.sync_replica(callback_etat=callback_etat)
+        elif incremental and self.base is not None:
+            self.base.load_incremental(callback_etat=callback_etat)
+        else:
+            self.base = self.BASE_CLASS.load_from_db(callback_etat=callback_etat)
 
     def _load_users(self):
         """Default implentation requires users from DB.
@@ -351,7 +518,10 @@ class abstractInterInterfaces:
             self.modules = {k: 0 for k in modules}  # low permission
             self.mode_online = False
 
-        self.base = self.BASE_CLASS.load_from_local()
+        if self.BASE_CLASS.REPLICA_SCHEME is not None:
+            self.base = self.BASE_CLASS.load_from_replica()
+        else:
+            self.base = self.BASE_CLASS.load_from_local()
 
     def launch_debug(self, mode_online):
         self.mode_online = mode_online
@@ -359,7 +529,10 @@ class abstractInterInterfaces:
         self.base = self.BASE_CLASS.load_from_local()
         self.load_modules()
 
-    def direct_load_remote_db(self):
+    def direct_load_remote_db(self, incremental=False):
+        if incremental:
+            self.base.load_incremental(callback_etat=lambda *args: None)
+            return
         tables = [t for t in sorted(self.base.TABLES)]
-        l = sql.abstractRequetesSQL.load_data(tables)()
+        l = sql.abstractRequetesSQL.load_data(tables)(use_cache=False)
         self.base = self.BASE_CLASS(l)
@@ -54,6 +54,17 @@ class abstractAcces:
             else:
                 return None
 
+    def normalised(self, item: str) -> Optional[str]:
+        """Accent and case insensitive version of self[item] (see formats.normalise_value).
+        Uses the shadow columns of the table when possible."""
+        if item in self.FIELDS_OPTIONS or item in self.modifications or self.Id is None:
+            return formats.normalise_value(self[item])
+        table = getattr(self.base, self.TABLE)
+        if type(self).__getitem__ is abstractAcces.__getitem__:
+            return table.get_normalised(self.Id, item)
+        # fields may be computed by subclasses : the cache is checked against self[item]
+        return table.get_shadow((type(self), item), self.Id, self[item])
+
     def modifie(self, key: str, value: Any) -> None:
         """Store the modification. `value` should be dumped in DB compatible format."""
         if key in self.FIELDS_OPTIONS:
@@ -129,20 +140,136 @@ class abstractDictTable(dict):
 
     def __init__(self, data):
         super().__init__(data or {})
+        self._shadow = {}  # column (field name or key) -> { id : (raw value, normalised value) }
+        self._fuzzy_indexes = {}  # hook name -> (to_string_hook, groups.TrigramIndex)
+        self._date_indexes = {}  # field -> groups.DateIndex
+        self._phone_indexes = {}  # field -> groups.PhoneIndex
+        self._search_snapshots = {}  # fields -> groups.SearchSnapshot
 
     def dumps(self):
         """Returns a list of dict. To be consistent with SQL-DB format."""
         return list(self.values())
 
+    def get_normalised(self, Id, field):
+        """Shadow column : accent and case insensitive version of the field (see formats.normalise_value).
+        Computed once, and again only when the value changes."""
+        return self.get_shadow(field, Id, self[Id].get(field))
+
+    def get_shadow(self, column, Id, raw):
+        """Normalised version of raw, cached in shadow column. Computed again only if raw changes."""
+        column = self._shadow.setdefault(column, {})
+        cached = column.get(Id)
+        if cached is None or (cached[0] is not raw and cached[0] != raw):
+            cached = column[Id] = (raw, formats.normalise_value(raw))
+        return cached[1]
+
+    def precompute_normalised(self, fields):
+        """Fill shadow columns of fields for all rows"""
+        for Id in self:
+            for field in fields:
+                self.get_normalised(Id, field)
+
     @staticmethod
     def _record_to_string(row):
         return str(row["id"])
 
-    def base_recherche_rapide(self, base, pattern, to_string_hook=None):
+    def get_fuzzy_index(self, to_string_hook=None, hook_name=None):
+        """Return the typo tolerant index (groups.TrigramIndex) of records strings.
+        Indexes are identified by `hook_name` ("record" for _record_to_string) : built on first call,
+        and then maintained by `refresh_indexes`. A custom hook without name gives a temporary index."""
+        if to_string_hook is None:
+            to_string_hook, hook_name = self._record_to_string, hook_name or "record"
+        stored = self._fuzzy_indexes.get(hook_name) if hook_name is not None else None
+        if stored is not None:
+            return stored[1]
+        index = groups.TrigramIndex()
+        for i, row in self.items():
+            index.add(i, to_string_hook(row))
+        if hook_name is not None:
+            self._fuzzy_indexes[hook_name] = (to_string_hook, index)
+        return index
+
+    def get_date_index(self, field):
+        """Return the sorted index (groups.DateIndex) of dates in field.
+        Built on first call, and then maintained by `refresh_indexes`."""
+        index = self._date_indexes.get(field)
+        if index is None:
+            index = self._date_indexes[field] = groups.DateIndex({i: row.get(field) for i, row in self.items()})
+        return index
+
+    def base_recherche_date(self, base, field, pattern):
+        """
+        Return a collection of acces whose date `field` match `pattern`, sorted by date.
+        Periods (see formats.parse_date_query) use the date index, other patterns are searched in rendered dates.
+        """
+        Ac = self.ACCES
+        query = formats.parse_date_query(pattern)
+        if query is None:
+            match = formats.abstractSearch.compile(formats.ASSOCIATION[field][1], pattern)
+            return groups.Collection(Ac(base, i) for i, row in self.items() if match(row.get(field)))
+        return groups.Collection(Ac(base, i) for i in self.get_date_index(field).search(*query))
+
+    def get_phone_index(self, field="tels"):
+        """Return the digits only index (groups.PhoneIndex) of phones lists in field.
+        Built on first call, and then maintained by `refresh_indexes`."""
+        index = self._phone_indexes.get(field)
+        if index is None:
+            index = self._phone_indexes[field] = groups.PhoneIndex()
+            for i, row in self.items():
+                # phones lists may be modified in place : tuples are indexed
+                index.add(i, tuple(row.get(field) or ()))
+        return index
+
+    def base_recherche_telephone(self, base, pattern, field="tels"):
+        """Return a collection of acces having a phone (in field) matching pattern, whatever its formatting"""
+        Ac = self.ACCES
+        if formats.phone_query(pattern) is None:
+            match = formats.abstractSearch.compile(formats.abstractSearch.in_telephones, pattern)
+            return groups.Collection(Ac(base, i) for i, row in self.items() if match(row.get(field)))
+        return groups.Collection(Ac(base, i) for i in self.get_phone_index(field).search(pattern))
+
+    def refresh_indexes(self, Id):
+        """Update the indexes for the row Id. Should be called when a row is added, modified in place or removed."""
+        self._search_snapshots.clear()
+        if Id not in self:
+            for column in self._shadow.values():
+                column.pop(Id, None)
+        for field, index in self._date_indexes.items():
+            if Id in self:
+                index.add(Id, self[Id].get(field))
+            else:
+                index.remove(Id)
+        for field, index in self._phone_indexes.items():
+            if Id in self:
+                index.add(Id, tuple(self[Id].get(field) or ()))
+            else:
+                index.remove(Id)
+        for to_string_hook, index in self._fuzzy_indexes.values():
+            if Id in self:
+                index.add(Id, to_string_hook(self[Id]))
+            else:
+                index.remove(Id)
+
+    def base_recherche_floue(self, base, pattern, k=20, to_string_hook=None, hook_name=None):
+        """
+        Return a collection of (at most) the k acces closest to `pattern`, best first. Tolerates typos.
+        The similarity (between 0 and 1) is stored in info `similarity`.
+        `hook_name` identifies to_string_hook, so that its index is kept (see get_fuzzy_index).
+        """
+        Ac = self.ACCES
+        results = self.get_fuzzy_index(to_string_hook, hook_name).search(pattern, k=k)
+        c = groups.Collection(Ac(base, i) for i, _ in results)
+        for i, similarity in results:
+            c.set_info(i, "similarity", similarity)
+        return c
+
+    def base_recherche_rapide(self, base, pattern, to_string_hook=None, fuzzy=False, hook_name=None):
         """
         Return a collection of access matching `pattern`.
         `to_string_hook` is an optionnal callable dict -> str to map record to string. Default to _record_to_string
+        If `fuzzy` is True and nothing matches, returns the results of base_recherche_floue (see `hook_name`).
         """
+        custom_hook = to_string_hook
         Ac = self.ACCES
         if pattern == "*":
             return groups.Collection(Ac(base, i) for i in self)
@@ -150,7 +277,7 @@ class abstractDictTable(dict):
         if len(pattern) >= MIN_CHAR_SEARCH:  # Needed chars.
             sub_patterns = pattern.split(" ")
             try:
-                regexps = tuple(re.compile(sub_pattern, flags=re.I)
+                regexps = tuple(re.compile(formats.strip_accents(sub_pattern), flags=re.I)
                                 for sub_pattern in sub_patterns)
             except re.error:
                 return groups.Collection()
@@ -161,8 +288,23 @@ class abstractDictTable(dict):
                         return False
                 return True
 
-            to_string_hook = to_string_hook or self._record_to_string
-            return groups.Collection(Ac(base, i) for i, p in self.items() if search(to_string_hook(p)))
+            if to_string_hook is None:
+                to_string_hook, hook_name = self._record_to_string, hook_name or "record"
+            # one shadow column by named hook ; strings of unnamed hooks are not kept
+            column = self._shadow.setdefault(("__record_string__", hook_name), {}) if hook_name is not None else {}
+
+            def normalised_string(Id, row):
+                # accent and case insensitive, computed again only if the string changes
+                s = to_string_hook(row)
+                cached = column.get(Id)
+                if cached is None or cached[0] != s:
+                    cached = column[Id] = (s, formats.strip_accents(s).casefold())
+                return cached[1]
+
+            c = groups.Collection(Ac(base, i) for i, p in self.items() if search(normalised_string(i, p)))
+            if fuzzy and not c:
+                return self.base_recherche_floue(base, pattern, to_string_hook=custom_hook, hook_name=hook_name)
+            return c
 
         return groups.Collection()
 
@@ -180,10 +322,71 @@ class abstractDictTable(dict):
         Ac = self.ACCES
         return groups.Collection(Ac(base, i) for i in self if criteria(Ac(base, i)))
 
+    def carry_indexes(self, old):
+        """Take over the indexes and shadow columns of old, the previous version of the table :
+        only rows added, modified or removed since are indexed again."""
+        changed = [Id for Id, row in old.items() if Id not in self or (self[Id] is not row and self[Id] != row)]
+        changed += [Id for Id in self if Id not in old]
+        self._shadow = old._shadow
+        for column in self._shadow.values():
+            for Id in changed:
+                column.pop(Id, None)
+        self._phone_indexes = old._phone_indexes
+        self._fuzzy_indexes = old._fuzzy_indexes
+        self._date_indexes = old._date_indexes
+        if not changed:
+            self._search_snapshots = old._search_snapshots
+        for Id in changed:
+            self.refresh_indexes(Id)
+
+    def search_snapshot(self, base, entete):
+        """Values of fields entete for all rows, sent to the workers of parallel search.
+        Shared by all collections of the table, and dropped when a row changes (see refresh_indexes)."""
+        entete = tuple(entete)
+        snapshot = self._search_snapshots.get(entete)
+        if snapshot is None:
+            Ac = self.ACCES
+            rows = [(Id, tuple(Ac(base, Id)[att] for att in entete)) for Id in self]
+            snapshot = self._search_snapshots[entete] = groups.SearchSnapshot(entete, rows)
+        return snapshot
+
     def to_collection(self, base):
         Ac = self.ACCES
         return groups.Collection(Ac(base, i) for i in self)
 
+    def to_id_collection(self, base, ids=None):
+        """Return a groups.IdCollection of ids (default to all ids of the table). No acces is created."""
+        return groups.IdCollection(self.ACCES, base, self if ids is None else ids)
+
+    def to_sorted_view(self, base, page_size=200):
+        """Return a view of the table, sorted and materialized as acces by pages (see groups.SortedView).
+        Sorting reads values through acces, so options and computed fields are supported."""
+        Ac = self.ACCES
+        return groups.SortedView(self, materialize=lambda i: Ac(base, i),
+                                 value=lambda i, attribut: Ac(base, i)[attribut], page_size=page_size)
+
+    def to_paged_collection(self, base, page_size=200, field=None):
+        """Return a collection fetching rows from DB by pages, with keyset pagination on id or on (field, id).
+        Fetched rows are stored in the table. Usefull for tables too large to be loaded at once.
+        """
+        Ac = self.ACCES
+
+        def fetch_page(last, size):
+            rows = sql.abstractRequetesSQL.load_page(Ac.TABLE, last, size, field, self.CHAMP_ID)()
+            page = []
+            for row in rows:
+                Id = _convert_id(row[self.CHAMP_ID])
+                self[Id] = dict(row)
+                self.refresh_indexes(Id)
+                page.append(Ac(base, Id))
+            return page
+
+        if field is None:
+            key = lambda acces: acces.Id
+        else:
+            key = lambda acces: (acces[field], acces.Id)
+        return groups.PagedCollection(fetch_page, page_size, key)
+
 
 class abstractListTable(list):
     """Represents one table : list [dict_attributes]"""
@@ -210,6 +413,15 @@ class abstractBase:
     LOCAL_DB_PATH = None
     """Local file path"""
 
+    SYNC_FIELD = "date_heure_modif"
+    """Field storing the last modification time of a row. Used by incremental loading"""
+
+    REPLICA_SCHEME = None
+    """If given, tables (with sql.cree_local_DB format) mirrored in the local SQLite replica"""
+
+    REPLICA_INDEXES = None
+    """Indexes of the replica (see sql.cree_local_DB)"""
+
     @classmethod
     def load_from_db(cls, callback_etat=print, out=None):
         """Launch data fetching then load data received.
@@ -272,15 +484,18 @@ class abstractBase:
             - list : list of tables content. The order is the one of sorted(TABLES.keys())
             - dict : {table_name : table_content }
         """
+        self.sync_marks = {}  # table_name -> high water mark, from rows sent by the DB
         if type(datas) is dict:
             for table_name, table_data in datas.items():
                 table = self._get_table(table_name, table_data)
                 setattr(self, table_name, table)
+                self._set_high_water_mark(table_name, table_data)
 
         elif type(datas) is list:
             for i, table_name in enumerate(sorted(self.TABLES.keys())):
                 table = self._get_table(table_name, datas[i])
                 setattr(self, table_name, table)
+                self._set_high_water_mark(table_name, datas[i])
 
     def dumps(self):
         """Return a dictionnary of current tables"""
@@ -295,8 +510,130 @@ class abstractBase:
     def load_partiel(self, **kwargs):
         for i, v in kwargs.items():
             assert i in self.TABLES
-            table = self._get_table(i, v)
+            old, table = getattr(self, i, None), self._get_table(i, v)
+            if isinstance(old, abstractDictTable) and type(old) is type(table):
+                table.carry_indexes(old)
             setattr(self, i, table)
+            self.sync_marks.pop(i, None)
+
+    def get_high_water_mark(self, table_name):
+        """Return the most recent `SYNC_FIELD` value received from the DB for the table,
+        or None if the table doesn't support incremental loading."""
+        return self.sync_marks.get(table_name)
+
+    def _set_high_water_mark(self, table_name, rows, previous=None):
+        """Record the mark of rows sent by the DB (never of in-memory rows, which may hold client values).
+        With previous, rows are a delta : the mark can only grow."""
+        if not (isinstance(getattr(self, table_name, None), abstractDictTable) and
+                isinstance(rows, (list, tuple)) and (rows or previous is not None)):
+            self.sync_marks.pop(table_name, None)
+            return
+        # rows may be sqlite3.Row, without get
+        marks = [row[self.SYNC_FIELD] if self.SYNC_FIELD in row.keys() else None for row in rows]
+        if None in marks:
+            self.sync_marks.pop(table_name, None)
+            return
+        if previous is not None:
+            marks.append(previous)
+        self.sync_marks[table_name] = max(marks)
+
+    def _merge_delta(self, table_name, changed_rows, id_rows):
+        """Return the content of table updated with `changed_rows`,
+        without rows missing from `id_rows`, and the ids of these deleted rows"""
+        table = getattr(self, table_name)
+        champ = table.CHAMP_ID
+        ids = set(_convert_id(r[champ]) for r in id_rows)
+        dic = {i: row for i, row in table.items() if i in ids}
+        deleted = [i for i in table if i not in ids]
+        dic.update((_convert_id(r[champ]), dict(r)) for r in changed_rows)
+        return dic, deleted
+
+    def load_incremental(self, callback_etat=print):
+        """Fetch only rows modified since the last loading (see `get_high_water_mark`), and merge them.
+        Tables without high water mark are fully reloaded.
+
+        :param callback_etat: state callback, taking  str,int,int as args
+        :return: dict { table_name : (changed rows, deleted ids) }, with None for tables fully reloaded
+        """
+        callback_etat("Synchronisation...", 0, 2)
+        tables = sorted(self.TABLES)
+        marks = {t: self.get_high_water_mark(t) for t in tables}
+        requetes = sql.Executant()
+        for t in tables:
+            if marks[t] is None:
+                requetes.extend(sql.abstractRequetesSQL.load_data([t]))
+            else:
+                champ = self.TABLES[t].CHAMP_ID
+                requetes.extend(sql.abstractRequetesSQL.load_data_since(t, self.SYNC_FIELD, marks[t], champ))
+        res = iter(requetes(use_cache=False))
+        callback_etat("Fusion...", 1, 2)
+        new_tables, deltas = {}, {}
+        for t in tables:
+            if marks[t] is None:
+                new_tables[t], deltas[t] = next(res), None
+            else:
+                changed = [dict(r) for r in next(res)]
+                new_tables[t], deleted = self._merge_delta(t, changed, next(res))
+                deltas[t] = (changed, deleted)
+        self.load_partiel(**new_tables)
+        for t in tables:
+            if deltas[t] is None:
+                self._set_high_water_mark(t, new_tables[t])
+            else:
+                self._set_high_water_mark(t, deltas[t][0], previous=marks[t])
+        return deltas
+
+    @staticmethod
+    def _check_replica_path():
+        if sql.ReplicaConnexion.PATH is None:
+            raise StructureError("No path for the local replica : replica_path should be given to sql.init_module !")
+
+    @classmethod
+    def init_replica(cls):
+        """Create (or reset) the local SQLite replica, following REPLICA_SCHEME"""
+        cls._check_replica_path()
+        sql.cree_local_DB(cls.REPLICA_SCHEME, cls.REPLICA_INDEXES, connexion_class=sql.ReplicaConnexion)
+
+    @classmethod
+    def load_from_replica(cls):
+        """Load datas from the local SQLite replica (no network access).
+        If the replica doesn't exist yet, it's created and an empty base is returned."""
+        cls._check_replica_path()
+        tables = sorted(cls.REPLICA_SCHEME)
+        try:
+            res = sql.ReplicaConnexion().execute(sql.abstractRequetesSQL.load_data(tables))
+        except StructureError:
+            logging.warning("No valid replica found. Creating a new one.")
+            cls.init_replica()
+            res = [[] for _ in tables]
+        return cls({t: rows for t, rows in zip(tables, res)})
+
+    def save_to_replica(self, deltas=None):
+        """Write tables in the local SQLite replica.
+
+        :param deltas: As returned by `load_incremental`. If None, all tables are fully written.
+        """
+        self._check_replica_path()
+        Requetes = sql.LocalRequetesSQL
+        requetes = sql.Executant()
+        for t in sorted(self.REPLICA_SCHEME):
+            table = getattr(self, t)
+            champ = getattr(table, "CHAMP_ID", "id")
+            delta = deltas.get(t) if deltas is not None else None
+            if delta is None:
+                requetes.append((f"DELETE FROM {t}", ()))
+                requetes.extend(Requetes.upsert_many(t, table.dumps(), key=champ))
+            else:
+                changed, deleted = delta
+                requetes.extend(Requetes.supprime_many(t, champ, deleted))
+                requetes.extend(Requetes.upsert_many(t, changed, key=champ))
+        if requetes:
+            sql.ReplicaConnexion().execute(requetes)
+
+    def sync_replica(self, callback_etat=print):
+        """Fetch rows modified on the remote DB (see `load_incremental`) and write them in the replica."""
+        deltas = self.load_incremental(callback_etat=callback_etat)
+        self.save_to_replica({t: d for t, d in deltas.items() if t in self.REPLICA_SCHEME})
 
     def save_to_local(self, callback_etat=print):
         """
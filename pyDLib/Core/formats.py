@@ -5,8 +5,15 @@
 import datetime
 import json
 import re
+import unicodedata
 from collections import defaultdict
 
+try:
+    import orjson
+    has_orjson = True
+except ImportError:
+    has_orjson = False
+
 ### ---------- JSON support -------------- ###
 class JsonEncoder(json.JSONEncoder):
     """Add python types encoding. Customs types should dumps to python types first."""
@@ -28,6 +35,28 @@ class JsonEncoder(json.JSONEncoder):
 
 
 
+_JSON_ENCODER = JsonEncoder(ensure_ascii=False)
+
+
+def _orjson_default(o):
+    converted = JsonEncoder.convert(o)
+    if converted is None:
+        raise TypeError(f"Type {type(o)} is not JSON serializable")
+    return converted
+
+
+def json_dumps(o):
+    """Same as json.dumps(o, ensure_ascii=False, cls=JsonEncoder), with a cached encoder.
+    Uses orjson if installed (note that orjson dumps NaN and infinity as null)."""
+    if has_orjson:
+        try:
+            return orjson.dumps(o, default=_orjson_default,
+                                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:  # not supported by orjson (big integers, ...)
+            pass
+    return _JSON_ENCODER.encode(o)
+
+
 def date_decoder(dic):
     """Add python types decoding. See JsonEncoder"""
     if '__date__' in dic:
@@ -185,6 +214,19 @@ MODE_PAIEMENT = {"vir": "Virement", "cheque": "Chèque", "esp": "Espèces", "cb"
 """Mode de paiements"""
 
 
+### ------ Normalisation ----- ###
+
+def strip_accents(s):
+    """Remove accents (diacritics), using NFKD decomposition"""
+    return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
+
+
+def normalise_value(objet):
+    """Accent and case insensitive string of objet, or None for empty objet.
+    Used by search functions supporting normalised values (see abstractSearch.compile)"""
+    return strip_accents(str(objet)).casefold() if objet else None
+
+
 class abstractSearch():
     """
     abstractSearch functions, which take `objet` and a `pattern` and return a matching boolean.
@@ -197,34 +239,144 @@ class abstractSearch():
 
     @staticmethod
     def in_string(objet, pattern):
-        """ abstractSearch dans une chaine, sans tenir compte de la casse. """
-        return bool(re.search(pattern, str(objet), flags=re.I)) if objet else False
+        """ abstractSearch dans une chaine, sans tenir compte de la casse ni des accents. """
+        return bool(re.search(strip_accents(pattern), normalise_value(objet), flags=re.I)) if objet else False
 
     @staticmethod
     def in_date(objet, pattern):
-        """ abstractSearch dans une date datetime.date"""
-        if objet:
-            pattern = re.sub(" ", '', pattern)
-            objet_str = abstractRender.date(objet)
-            return bool(re.search(pattern, objet_str))
-        return False
+        """ abstractSearch dans une date datetime.date.
+        Les motifs de type période (cf parse_date_query) sont comparés directement à la date."""
+        return _compile_in_dates(abstractRender.date)(pattern)(objet)
 
     @staticmethod
     def in_dateheure(objet, pattern):
-        """ abstractSearch dans une date-heure datetime.datetime (cf abstractRender.dateheure) """
-        if objet:
-            pattern = re.sub(" ", '', pattern)
-            objet_str = abstractRender.dateheure(objet)
-            return bool(re.search(pattern, objet_str))
-        return False
+        """ abstractSearch dans une date-heure datetime.datetime (cf abstractRender.dateheure et parse_date_query) """
+        return _compile_in_dates(abstractRender.dateheure)(pattern)(objet)
 
     @staticmethod
     def in_telephones(objet, pattern):
-        """ abstractSearch dans une liste de téléphones."""
-        objet = objet or []
-        if pattern == '' or not objet:
-            return False
-        return max(bool(re.search(pattern, t)) for t in objet)
+        """ abstractSearch dans une liste de téléphones.
+        Les motifs numériques sont comparés aux chiffres seuls, sans tenir compte de la mise en forme."""
+        return _compile_in_telephones(pattern)(objet)
+
+
+    @staticmethod
+    def compile(fonction, pattern, normalised=False):
+        """Return a callable `objet` -> bool equivalent to fonction(objet, pattern),
+        with the preprocessing of pattern done once. Unknown functions are simply wrapped.
+        If normalised is True, the callable expects normalise_value(objet) instead of objet
+        (only for functions in `supports_normalised`)."""
+        if normalised:
+            return _NORMALISED_COMPILERS[fonction](pattern)
+        compiler = _SEARCH_COMPILERS.get(fonction)
+        if compiler is None:
+            return lambda objet: fonction(objet, pattern)
+        return compiler(pattern)
+
+    @staticmethod
+    def supports_normalised(fonction):
+        """True if fonction may be compiled for normalised values (see normalise_value)"""
+        return fonction in _NORMALISED_COMPILERS
+
+
+def _compile_in_normalised(pattern):
+    regexp = re.compile(strip_accents(pattern), flags=re.I)
+    return lambda normalised: normalised is not None and regexp.search(normalised) is not None
+
+
+def _compile_in_string(pattern):
+    match = _compile_in_normalised(pattern)
+    return lambda objet: match(normalise_value(objet))
+
+
+def _compile_in_rendered(render):
+    def compiler(pattern):
+        regexp = re.compile(re.sub(" ", '', pattern))
+        return lambda objet: bool(objet) and regexp.search(render(objet)) is not None
+    return compiler
+
+
+_DATE_QUERY = re.compile(r"^(?:(\d{1,2})/)??(?:(\d{1,2})/)?(\d{4})$")
+
+
+def _parse_date_bound(s):
+    """Return the range [start, end[ of "yyyy", "m/yyyy" or "d/m/yyyy", or None"""
+    match = _DATE_QUERY.match(s)
+    if match is None:
+        return None
+    day, month, year = match.groups()
+    year = int(year)
+    try:
+        if month is None:
+            return datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+        month = int(month)
+        start = datetime.date(year, month, 1)
+        if day is None:
+            end = datetime.date(year + 1, 1, 1) if month == 12 else datetime.date(year, month + 1, 1)
+            return start, end
+        start = datetime.date(year, month, int(day))
+        return start, start + datetime.timedelta(days=1)
+    except (ValueError, OverflowError):
+        return None
+
+
+def parse_date_query(pattern):
+    """Parse a date search pattern : "2018", "03/2018", "12/3/2018", or a period between two of them
+    ("2017-2019", "3/2018-6/2018"). Periods are written without spaces, since searches split patterns on spaces.
+
+    :return: (start, end) dates, end being excluded, or None if pattern is not a date query
+    """
+    bounds = [_parse_date_bound(b.strip()) for b in pattern.split("-")]
+    if not 1 <= len(bounds) <= 2 or None in bounds:
+        return None
+    start, end = bounds[0][0], bounds[-1][1]
+    if end <= start:
+        return None
+    return start, end
+
+
+def as_date(objet):
+    """datetime.datetime -> datetime.date (comparisons between them are not allowed)"""
+    return objet.date() if isinstance(objet, datetime.datetime) else objet
+
+
+def _compile_in_dates(render):
+    """Compare dates to the range of pattern (see parse_date_query), or search in rendered dates otherwise"""
+    in_rendered = _compile_in_rendered(render)
+
+    def compiler(pattern):
+        query = parse_date_query(pattern)
+        if query is None:
+            return in_rendered(pattern)
+        start, end = query
+        return lambda objet: bool(objet) and start <= as_date(objet) < end
+    return compiler
+
+
+_NON_DIGITS = re.compile(r"\D")
+_PHONE_QUERY = re.compile(r"^[\d\s.+()-]*\d[\d\s.+()-]*$")
+
+
+def phone_digits(telephone):
+    """Digits only version of telephone : "06 12-34" -> "061234" """
+    return _NON_DIGITS.sub("", telephone or "")
+
+
+def phone_query(pattern):
+    """Return the digits of pattern if it's a phone number (digits and separators only), None otherwise"""
+    if _PHONE_QUERY.match(pattern):
+        return phone_digits(pattern)
+    return None
+
+
+def _compile_in_telephones(pattern):
+    if pattern == '':
+        return lambda objet: False
+    digits = phone_query(pattern)
+    if digits is not None:
+        return lambda objet: bool(objet) and any(digits in phone_digits(t) for t in objet)
+    regexp = re.compile(pattern)
+    return lambda objet: bool(objet) and any(regexp.search(t) for t in objet)
 
 
 class abstractRender():
@@ -298,6 +450,20 @@ class abstractRender():
         return "\n".join(" - ".join(objet[2*i:2*i+1]) for i in range(len(objet)//3) )
 
 
+_SEARCH_COMPILERS = {
+    abstractSearch.nothing: lambda pattern: (lambda objet: False),
+    abstractSearch.in_string: _compile_in_string,
+    abstractSearch.in_date: _compile_in_dates(abstractRender.date),
+    abstractSearch.in_dateheure: _compile_in_dates(abstractRender.dateheure),
+    abstractSearch.in_telephones: _compile_in_telephones,
+}
+"""Search function -> callable pattern -> matcher (see abstractSearch.compile)"""
+
+_NORMALISED_COMPILERS = {
+    abstractSearch.in_string: _compile_in_normalised,
+}
+
+
 def _type_string(label, case=None):
     """Shortcut for string like fields"""
     return label, abstractSearch.in_string, lambda s: abstractRender.default(s, case=case), ""
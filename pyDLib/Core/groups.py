@@ -1,36 +1,250 @@
 """Defines list structure with sorting and search functions"""
+import bisect
+import heapq
+import pickle
+import re
+import weakref
+from collections import Counter, OrderedDict, defaultdict
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8 : snapshots are sent with each search
+    shared_memory = None
 
 from . import formats
 
+PARALLEL_MIN_ROWS = 50000
+"""Minimum size of a collection for parallel search (see Collection.recherche)"""
+
+PARALLEL_CHUNK_SIZE = 20000
+"""Number of rows sent to a worker process at once"""
+
+WORKER_CACHED_CHUNKS = 32
+"""Number of snapshot chunks kept by each worker process"""
+
+_WORKER_CHUNKS = OrderedDict()  # in worker processes : (shared memory name, offset) -> rows
+
+
+def _load_chunk(chunk):
+    """Rows of a snapshot chunk : pickled bytes, or (name, offset, size) in shared memory, read once by worker"""
+    if isinstance(chunk, bytes):
+        return pickle.loads(chunk)
+    name, offset, size = chunk
+    rows = _WORKER_CHUNKS.get((name, offset))
+    if rows is None:
+        shm = shared_memory.SharedMemory(name=name)  # the main process unlinks it
+        try:
+            rows = pickle.loads(bytes(shm.buf[offset:offset + size]))
+        finally:
+            shm.close()
+        _WORKER_CHUNKS[(name, offset)] = rows
+        while len(_WORKER_CHUNKS) > WORKER_CACHED_CHUNKS:
+            _WORKER_CHUNKS.popitem(last=False)
+    else:
+        _WORKER_CHUNKS.move_to_end((name, offset))
+    return rows
+
+
+def _release_shared_memory(shm):
+    shm.close()
+    shm.unlink()
+
+
+class SearchSnapshot:
+    """Values of searched fields, by chunks of (Id, values), pickled once.
+    Chunks are stored in shared memory when available, so that workers only receive their location."""
+
+    def __init__(self, entete, rows):
+        self.entete = tuple(entete)
+        self.ids = {Id for Id, _ in rows}
+        blobs = [pickle.dumps(rows[k:k + PARALLEL_CHUNK_SIZE]) for k in range(0, len(rows), PARALLEL_CHUNK_SIZE)]
+        if shared_memory is None:
+            self.chunks = blobs
+            return
+        shm = shared_memory.SharedMemory(create=True, size=max(1, sum(len(b) for b in blobs)))
+        weakref.finalize(self, _release_shared_memory, shm)
+        self.chunks, offset = [], 0
+        for blob in blobs:
+            shm.buf[offset:offset + len(blob)] = blob
+            self.chunks.append((shm.name, offset, len(blob)))
+            offset += len(blob)
+
+
+def _recherche_chunk(args):
+    """Worker of parallel search. `chunk` is a snapshot chunk (see _load_chunk) of (Id, values),
+    values being aligned with `fonctions`. Returns the list of (Id, fonts) of matching rows."""
+    fonctions, sub_patterns, chunk = args
+    rows = _load_chunk(chunk)
+    matchers = [[formats.abstractSearch.compile(f, sub_pattern) for f in fonctions] for sub_pattern in sub_patterns]
+    res = []
+    for i, values in rows:
+        fonts = [False] * len(fonctions)
+        for fields in matchers:
+            found = False
+            for j, match in enumerate(fields):
+                if match(values[j]):
+                    found = True
+                    fonts[j] = True
+            if not found:
+                break
+        else:
+            res.append((i, fonts))
+    return res
+
+
+class _OrderKey:
+    """Composite sort key, each component having its own order (True for decreasing)"""
+
+    __slots__ = ("keys", "orders")
+
+    def __init__(self, keys, orders):
+        self.keys = keys
+        self.orders = orders
+
+    def __lt__(self, other):
+        for key, other_key, order in zip(self.keys, other.keys, self.orders):
+            if key != other_key:
+                return other_key < key if order else key < other_key
+        return False
+
 
 class sortableListe(list):
-    """Minimal implementation to work with GUI models"""
+    """Minimal implementation to work with GUI models.
+    In order-maintaining mode (`keep_sorted`), once the list has been sorted, `insert_sorted` and `reposition`
+    place items by binary search on sort keys, instead of sorting again.
+    """
 
-    def sort(self, attribut, order=False):
-        """
-        Implément un tri par attrbut.
+    keep_sorted = False
+    _criteres = None  # last sort criteres
 
-        :param str attribut: Nom du champ concerné
-        :param bool order: Ordre croissant ou décroissant
-        """
+    @staticmethod
+    def _sort_key_function(attribut, value=None):
+        """value is an optionnal callable item -> value of attribut. Default to item[attribut]"""
         value_default = formats.ASSOCIATION[attribut][3]
+        value = value or (lambda d : d[attribut])
 
         if type(value_default) is str:  # case insensitive sort
-            get = lambda d : (d[attribut] or value_default).casefold()
+            get = lambda d : (value(d) or value_default).casefold()
         elif type(value_default) is dict: #can't sort dicts
             def get(d):
-                u = d[attribut] or value_default
+                u = value(d) or value_default
                 return [str(u[i]) for i in sorted(u.keys())]
         else:
-            get = lambda d : d[attribut] or value_default
+            get = lambda d : value(d) or value_default
+        return get
 
-        list.sort(self, key=get, reverse=order)
+    def _sort_keys(self, attribut):
+        """Return the sort keys for attribut, in the order of the list"""
+        get = self._sort_key_function(attribut)
+        return [get(d) for d in self]
+
+    def invalidate_sort_keys(self, Id=None):
+        """Should be called when data of items changes. Nothing to do without cache."""
+        pass
+
+    def sort(self, attribut, order=False):
+        """
+        Implément un tri par attrbut.
+
+        :param str attribut: Nom du champ concerné
+        :param bool order: Ordre croissant ou décroissant
+        """
+        self.sort_multi([(attribut, order)])
+
+    def sort_multi(self, criteres):
+        """
+        Tri stable sur plusieurs attributs.
+
+        :param criteres: Liste de (`attribut`, `order`), par priorité décroissante
+        """
+        positions = list(range(len(self)))
+        for attribut, order in reversed(criteres):
+            keys = self._sort_keys(attribut)
+            positions.sort(key=keys.__getitem__, reverse=order)
+        list.__setitem__(self, slice(None), [self[i] for i in positions])
+        self._criteres = list(criteres)
+        self._on_reorder()
+
+    @property
+    def is_ordered(self):
+        """True if items are kept sorted"""
+        return self.keep_sorted and bool(self._criteres)
+
+    def _item_sort_key(self, item, attribut):
+        return self._sort_key_function(attribut)(item)
+
+    def _order_key(self, item):
+        return _OrderKey([self._item_sort_key(item, attribut) for attribut, _ in self._criteres],
+                         [order for _, order in self._criteres])
+
+    def insert_position(self, item):
+        """Return the row where item should be inserted : after equal items in order-maintaining mode,
+        at the end otherwise."""
+        if not self.is_ordered:
+            return len(self)
+        return self._bisect(self._order_key(item), len(self))
+
+    def reposition_target(self, row):
+        """Return the row that item at row should occupy (after a change of its data), without moving it."""
+        if not self.is_ordered:
+            return row
+        return self._bisect(self._order_key(self[row]), len(self) - 1, skip=row)
+
+    def _bisect(self, key, size, skip=None):
+        """Binary search (insert after equals) in the list of given size, ignoring row `skip`"""
+        lo, hi = 0, size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            i = mid + 1 if skip is not None and mid >= skip else mid
+            if key < self._order_key(self[i]):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def insert_at(self, row, item):
+        list.insert(self, row, item)
+
+    def append(self, item):
+        """Inserts item at its sorted position in order-maintaining mode"""
+        if self.is_ordered:
+            self.insert_sorted(item)
+        else:
+            list.append(self, item)
+
+    def extend(self, items):
+        list.extend(self, items)
+        if self.is_ordered:
+            self.sort_multi(self._criteres)
+
+    def move(self, row, new_row):
+        """Move item at row, so that it ends at new_row"""
+        list.insert(self, new_row, list.pop(self, row))
+
+    def insert_sorted(self, item):
+        """Insert item at its sorted position (see `insert_position`). Returns the row used."""
+        row = self.insert_position(item)
+        self.insert_at(row, item)
+        return row
+
+    def reposition(self, row):
+        """Move item at row to keep the list sorted. Returns the new row."""
+        new_row = self.reposition_target(row)
+        if new_row != row:
+            self.move(row, new_row)
+        return new_row
 
     def sort_by_niveau(self):
         def g(acces):
             return self.get_info(Id=acces.Id).get('niveau', 0)
 
         list.sort(self, key=g, reverse=True)
+        self._criteres = None
+        self._on_reorder()
+
+    def _on_reorder(self):
+        """Called after the order of the list has changed"""
+        pass
 
     def get_info(self, key=None, Id=None):
         return {}
@@ -39,7 +253,7 @@ class sortableListe(list):
         """Return the row of given Id if it'exists, otherwise None. Only works with pseudo-acces"""
         try:
             return [a.Id for a in self].index(Id)
-        except IndexError:
+        except ValueError:
             return
 
 
@@ -48,6 +262,9 @@ class Collection(sortableListe):
     """List of acces. Implements search function.
     Ensure unicity of ids.
     `infos` attribut stores rendering meta data on accesses (font, color)
+    `_index` maps ids to positions. It's maintained by the methods of the collection (including item assignment) :
+    others list methods (insert, sort, ...) should not be used.
+    Sort keys are cached by field and id : `invalidate_sort_keys` should be called when datas change.
     """
 
     @classmethod
@@ -57,26 +274,142 @@ class Collection(sortableListe):
     def __init__(self, l_acces=()):
         super().__init__(l_acces)
         self.infos = {}
+        self._sort_keys_cache = {}  # attribut -> { Id : key }
+        self._snapshot = None  # SearchSnapshot of the last parallel search
+        self._on_reorder()
+
+    def _on_reorder(self):
+        self._index = {a.Id: i for i, a in enumerate(self)}
+
+    def _reindex_from(self, start):
+        for i in range(start, len(self)):
+            self._index[self[i].Id] = i
+
+    def index_from_id(self, Id):
+        """Return the row of given Id if it'exists, otherwise None"""
+        return self._index.get(Id)
+
+    def _item_sort_key(self, item, attribut):
+        cache = self._sort_keys_cache.setdefault(attribut, {})
+        try:
+            return cache[item.Id]
+        except KeyError:
+            key = cache[item.Id] = self._sort_key_function(attribut)(item)
+            return key
+
+    def _sort_keys(self, attribut):
+        cache = self._sort_keys_cache.setdefault(attribut, {})
+        get = None
+        keys = []
+        for acces in self:
+            try:
+                keys.append(cache[acces.Id])
+            except KeyError:
+                get = get or self._sort_key_function(attribut)
+                key = cache[acces.Id] = get(acces)
+                keys.append(key)
+        return keys
+
+    def invalidate_sort_keys(self, Id=None):
+        """Forget cached sort keys of Id, or of all acces if Id is None, and the parallel search snapshot"""
+        self._snapshot = None
+        self._forget_sort_keys(Id)
+
+    def _forget_sort_keys(self, Id=None):
+        if Id is None:
+            self._sort_keys_cache = {}
+        else:
+            for cache in self._sort_keys_cache.values():
+                cache.pop(Id, None)
 
     def clear(self):
         list.__init__(self)
         self.infos = {}
+        self._index = {}
+        self._sort_keys_cache = {}
+        self._snapshot = None
 
     def append(self, acces, **kwargs):
-        """Append acces to list. Quite slow since it checks uniqueness.
+        """Append acces to list. Checks uniqueness.
         kwargs may set `info` for this acces.
+        In order-maintaining mode, acces is inserted at its sorted position.
         """
-        if acces.Id in set(ac.Id for ac in self):
+        if self.is_ordered:
+            self.insert_sorted(acces, **kwargs)
+            return
+        if acces.Id in self._index:
             raise ValueError("Acces id already in list !")
+        self._index[acces.Id] = len(self)
         list.append(self, acces)
         if kwargs:
             self.infos[acces.Id] = kwargs
 
+    def __setitem__(self, row, acces):
+        """Replace acces at row (or slice). Checks uniqueness."""
+        if isinstance(row, slice):
+            new = list(self)
+            new[row] = acces
+            if len({a.Id for a in new}) != len(new):
+                raise ValueError("Acces id already in list !")
+            list.__setitem__(self, slice(None), new)
+            self.invalidate_sort_keys()
+            self._on_reorder()
+            return
+        old = self[row]
+        if acces.Id != old.Id and acces.Id in self._index:
+            raise ValueError("Acces id already in list !")
+        list.__setitem__(self, row, acces)
+        del self._index[old.Id]
+        self._index[acces.Id] = row % len(self)
+        self.invalidate_sort_keys(old.Id)
+        self.invalidate_sort_keys(acces.Id)
+
+    def insert_at(self, row, acces, **kwargs):
+        """Insert acces at row. Checks uniqueness."""
+        if acces.Id in self._index:
+            raise ValueError("Acces id already in list !")
+        list.insert(self, row, acces)
+        self._reindex_from(row)
+        if kwargs:
+            self.infos[acces.Id] = kwargs
+
+    def insert_sorted(self, acces, **kwargs):
+        row = self.insert_position(acces)
+        self.insert_at(row, acces, **kwargs)
+        return row
+
+    def reposition_target(self, row):
+        self.invalidate_sort_keys(self[row].Id)
+        return super().reposition_target(row)
+
+    def move(self, row, new_row):
+        super().move(row, new_row)
+        for i in range(min(row, new_row), max(row, new_row) + 1):
+            self._index[self[i].Id] = i
+
+    def pop(self, i=-1):
+        acces = list.pop(self, i)
+        del self._index[acces.Id]
+        self._forget_sort_keys(acces.Id)
+        if i != -1:
+            self._reindex_from(i if i >= 0 else len(self) + i + 1)
+        return acces
+
     def remove_id(self,key):
         """Suppress acces with id = key"""
         self.infos.pop(key, "")
-        new_l = [a for a in self if not (a.Id == key)]
-        list.__init__(self, new_l)
+        self._forget_sort_keys(key)
+        i = self._index.pop(key, None)
+        if i is not None:
+            list.__delitem__(self, i)
+            self._reindex_from(i)
+
+    def copy(self):
+        c = Collection(self)
+        c.infos = {Id: dict(info) for Id, info in self.infos.items()}
+        c.keep_sorted, c._criteres = self.keep_sorted, self._criteres
+        c._snapshot = self._snapshot  # indexed by Id : still valid for a subset
+        return c
 
     def __repr__(self):
         if len(self) > 0:
@@ -99,50 +432,490 @@ class Collection(sortableListe):
         current_info[key] = value
         self.infos[Id] = current_info
 
-    def recherche(self, pattern, entete):
+    def recherche(self, pattern, entete, executor=None):
         """Performs a search field by field, using functions defined in formats.
         Matchs are marked with info[`font`]
 
         :param pattern: String to look for
         :param entete: Fields to look into
+        :param executor: Optionnal concurrent.futures.ProcessPoolExecutor, used for collections larger
+            than PARALLEL_MIN_ROWS
         :return: Nothing. The collection is changed in place
         """
+        if executor is not None and len(self) >= PARALLEL_MIN_ROWS:
+            if self._recherche_parallele(pattern, entete, executor):
+                return
 
         new_liste = []
-        sub_patterns = pattern.split(" ")
+        search = formats.abstractSearch
+        # fields matched against accent and case insensitive values (shadow columns for acces)
+        normalised = {att for att in entete if search.supports_normalised(formats.ASSOCIATION[att][1])}
+        # one list of (field, matcher) by sub-pattern
+        matchers = [[(att, search.compile(formats.ASSOCIATION[att][1], sub_pattern, normalised=att in normalised))
+                     for att in entete] for sub_pattern in pattern.split(" ")]
         for p in self:
+            values = {}
+            for att in entete:
+                if att not in normalised:
+                    values[att] = p[att]
+                elif hasattr(p, "normalised"):
+                    values[att] = p.normalised(att)
+                else:
+                    values[att] = formats.normalise_value(p[att])
             d_font = {att: False for att in entete}
-            row_valid = True
-            for sub_pattern in sub_patterns:
+            for fields in matchers:
                 found = False
-                for att in entete:
-                    fonction_recherche = formats.ASSOCIATION[att][1]
-                    attr_found = bool(fonction_recherche(p[att], sub_pattern))
-                    if attr_found:
+                for att, match in fields:
+                    if match(values[att]):
                         found = True
                         d_font[att] = True
                 if not found:
-                    row_valid = False
                     break
-            if row_valid:
+            else:
                 new_liste.append(p)
                 info = dict(self.get_info(Id=p.Id),font=d_font)
                 self.infos[p.Id] = info
 
         list.__init__(self, new_liste)
+        self._on_reorder()
+
 
+    def _recherche_parallele(self, pattern, entete, executor):
+        """Search with worker processes, on a snapshot of the fields values.
+        The snapshot is built once, and kept until datas change (see _search_snapshot) : then,
+        only patterns are sent to workers.
+        Returns False (doing nothing) if search functions or values can't be sent to workers."""
+        fonctions = [formats.ASSOCIATION[att][1] for att in entete]
+        try:
+            pickle.dumps(fonctions)
+            snapshot = self._search_snapshot(entete)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            return False
+        sub_patterns = pattern.split(" ")
+        matches = []
+        for chunk_matches in executor.map(_recherche_chunk, [(fonctions, sub_patterns, c) for c in snapshot.chunks]):
+            # the snapshot may hold more rows than the collection, in another order
+            matches.extend((self._index[Id], fonts) for Id, fonts in chunk_matches if Id in self._index)
+        matches.sort(key=lambda m: m[0])
+        new_liste = []
+        for i, fonts in matches:
+            p = self[i]
+            new_liste.append(p)
+            info = dict(self.get_info(Id=p.Id), font=dict(zip(entete, fonts)))
+            self.infos[p.Id] = info
+        list.__init__(self, new_liste)
+        self._on_reorder()
+        return True
+
+    def _search_snapshot(self, entete):
+        """Return the snapshot of the fields values. The one of the table is used when possible
+        (see abstractDictTable.search_snapshot), so that it is shared by the collections of this table.
+        Otherwise, it's built again if fields or acces changed."""
+        table = getattr(self[0].base, self[0].TABLE, None) if self else None
+        if hasattr(table, "search_snapshot") and all(Id in table for Id in self._index):
+            return table.search_snapshot(self[0].base, entete)
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.entete != tuple(entete) or any(Id not in snapshot.ids for Id in self._index):
+            rows = [(p.Id, tuple(p[att] for att in entete)) for p in self]
+            snapshot = self._snapshot = SearchSnapshot(entete, rows)
+        return snapshot
 
     def extend(self, collection):
         """Merges collections. Ensure uniqueness of ids"""
-        l_ids = set([a.Id for a in self])
         for acces in collection:
-            if not acces.Id in l_ids:
+            if not acces.Id in self._index:
+                self._index[acces.Id] = len(self)
                 list.append(self,acces)
                 info = collection.get_info(Id=acces.Id)
                 if info:
                     self.infos[acces.Id] = info
+        if self.is_ordered:
+            self.sort_multi(self._criteres)
 
 
+class SearchSession:
+    """Search-as-you-type helper. Remembers the last pattern and results for each header :
+    when the new pattern refines the previous one, only the previous matches are searched."""
 
+    def __init__(self, get_all):
+        """
+        :param get_all: Callable returning the whole collection to search in
+        """
+        self.get_all = get_all
+        self._last = {}  # tuple(entete) -> (pattern, collection)
+
+    def reset(self):
+        """Should be called when datas change"""
+        self._last = {}
+
+    @staticmethod
+    def is_refinement(old_pattern, new_pattern, entete=()):
+        """True if every row matching new_pattern also matches old_pattern :
+        fields are searched by substring (see formats.abstractSearch.supports_normalised),
+        sub-patterns are plain text, and each old sub-pattern is contained in a new one."""
+        if not all(formats.abstractSearch.supports_normalised(formats.ASSOCIATION[att][1]) for att in entete):
+            return False
+        olds, news = old_pattern.split(" "), new_pattern.split(" ")
+        if any(re.escape(p) != p for p in olds + news):  # regular expression
+            return False
+        return all(any(old in new for new in news) for old in olds)
+
+    def recherche(self, pattern, entete, executor=None):
+        """Return a new collection of acces matching pattern (see Collection.recherche)"""
+        key = tuple(entete)
+        last = self._last.get(key)
+        if last is not None and self.is_refinement(last[0], pattern, entete):
+            collection = last[1].copy()
+        else:
+            collection = self.get_all()
+        collection.recherche(pattern, entete, executor=executor)
+        self._last[key] = (pattern, collection.copy())
+        return collection
+
+
+class _SyncedIndex:
+    """Base of indexes remembering the indexed value of each id, to be updated against current datas.
+    Subclasses implement `_add` and `_remove`."""
+
+    def __init__(self):
+        self.values = {}  # id -> indexed value
+
+    def add(self, Id, value):
+        """Index value for Id, replacing the previous one if any"""
+        self.remove(Id)
+        self.values[Id] = value
+        self._add(Id, value)
+
+    def remove(self, Id):
+        if Id in self.values:
+            self._remove(Id, self.values.pop(Id))
+
+    def sync(self, values):
+        """Update the index to values {Id: value} : only new, changed and removed ids are indexed again"""
+        for Id in [Id for Id in self.values if Id not in values]:
+            self.remove(Id)
+        for Id, value in values.items():
+            old = self.values.get(Id, self)
+            if old is not value and old != value:
+                self.add(Id, value)
+
+
+class TrigramIndex(_SyncedIndex):
+    """Typo tolerant search index. Strings are normalised (see formats.normalise_value) and split in trigrams.
+    Only rows sharing trigrams with the pattern are scored, by Jaccard similarity of trigrams sets."""
+
+    def __init__(self):
+        super().__init__()
+        self.postings = defaultdict(set)  # trigram -> ids
+        self.trigrams = {}  # id -> trigrams
+
+    @staticmethod
+    def _trigrams(string):
+        words = (formats.normalise_value(string) or "").split()
+        return frozenset(w[i:i + 3] for word in words for w in [f"  {word} "] for i in range(len(w) - 2))
+
+    def _add(self, Id, string):
+        trigrams = self._trigrams(string)
+        self.trigrams[Id] = trigrams
+        for t in trigrams:
+            self.postings[t].add(Id)
+
+    def _remove(self, Id, string):
+        for t in self.trigrams.pop(Id, ()):
+            self.postings[t].discard(Id)
+
+    def search(self, pattern, k=20, min_similarity=0.2):
+        """Return up to k (Id, similarity), best first"""
+        query = self._trigrams(pattern)
+        if not query:
+            return []
+        shared = Counter()
+        for t in query:
+            shared.update(self.postings.get(t, ()))
+        scored = ((n / (len(query) + len(self.trigrams[Id]) - n), Id) for Id, n in shared.items())
+        best = heapq.nlargest(k, (item for item in scored if item[0] >= min_similarity), key=lambda item: item[0])
+        return [(Id, similarity) for similarity, Id in best]
+
+
+class DateIndex(_SyncedIndex):
+    """Index of dates (or datetimes, compared by date), sorted : periods are found by binary search."""
+
+    def __init__(self, values=None):
+        """values is an optionnal dict {Id: date}, sorted once"""
+        super().__init__()
+        self.values = {Id: d for Id, d in (values or {}).items() if d}
+        rows = sorted(((formats.as_date(d), Id) for Id, d in self.values.items()), key=lambda r: r[0])
+        self.dates = [d for d, _ in rows]
+        self.ids = [Id for _, Id in rows]
+
+    def _add(self, Id, value):
+        if not value:
+            return
+        d = formats.as_date(value)
+        i = bisect.bisect_right(self.dates, d)
+        self.dates.insert(i, d)
+        self.ids.insert(i, Id)
+
+    def _remove(self, Id, value):
+        if not value:
+            return
+        d = formats.as_date(value)
+        i = self.ids.index(Id, bisect.bisect_left(self.dates, d), bisect.bisect_right(self.dates, d))
+        del self.dates[i]
+        del self.ids[i]
 
+    def search(self, start, end):
+        """Return the ids with start <= date < end, sorted by date"""
+        return self.ids[bisect.bisect_left(self.dates, start):bisect.bisect_left(self.dates, end)]
 
+
+class PhoneIndex(_SyncedIndex):
+    """Index of phone numbers, on digits only (see formats.phone_digits).
+    Digits trigrams map to ids : only rows sharing all the trigrams of the pattern are checked.
+    Indexed values are tuples of phones."""
+
+    N = 3
+
+    def __init__(self):
+        super().__init__()
+        self.postings = defaultdict(set)  # digits trigram -> ids
+        self.numbers = {}  # id -> digits of phones
+
+    def _grams(self, digits):
+        return {digits[i:i + self.N] for i in range(len(digits) - self.N + 1)}
+
+    def _add(self, Id, telephones):
+        numbers = tuple(d for d in (formats.phone_digits(t) for t in telephones or ()) if d)
+        if not numbers:
+            return
+        self.numbers[Id] = numbers
+        for number in numbers:
+            for gram in self._grams(number):
+                self.postings[gram].add(Id)
+
+    def _remove(self, Id, telephones):
+        for number in self.numbers.pop(Id, ()):
+            for gram in self._grams(number):
+                self.postings[gram].discard(Id)
+
+    def search(self, pattern):
+        """Return the ids having a phone containing the digits of pattern"""
+        digits = formats.phone_digits(pattern)
+        if not digits:
+            return []
+        if len(digits) < self.N:
+            candidates = self.numbers
+        else:
+            postings = sorted((self.postings.get(gram, set()) for gram in self._grams(digits)), key=len)
+            candidates = set.intersection(*postings)
+        return [Id for Id in candidates if any(digits in number for number in self.numbers[Id])]
+
+
+class IdCollection:
+    """Ordered set of ids, materialized as acces only when iterated or indexed.
+    Union, intersection and difference work on ids (O(n)), keeping the order of the left operand.
+    It is not a sortableListe (no sort, insert_position or is_ordered) : convert it with to_collection()
+    before giving it to a GUI model.
+
+    :param acces_class: Class of acces
+    :param base: Reference on the whole base
+    :param ids: Iterable of ids. Duplicates are ignored
+    """
+
+    def __init__(self, acces_class, base, ids=()):
+        self.acces_class = acces_class
+        self.base = base
+        self.ids = list(dict.fromkeys(ids))
+        self._ids_set = set(self.ids)
+
+    @classmethod
+    def from_collection(cls, collection, acces_class=None, base=None):
+        """Use acces_class and base of the first acces of collection if not given"""
+        if collection and (acces_class is None or base is None):
+            acces_class = acces_class or type(collection[0])
+            base = base or collection[0].base
+        return cls(acces_class, base, (a.Id for a in collection))
+
+    def to_collection(self):
+        return Collection(self)
+
+    def _new(self, ids):
+        c = IdCollection(self.acces_class, self.base)
+        c.ids = ids
+        c._ids_set = set(ids)
+        return c
+
+    @staticmethod
+    def _ids_of(other):
+        if isinstance(other, IdCollection):
+            return other._ids_set
+        if isinstance(other, Collection):
+            return other._index.keys()
+        return {getattr(i, "Id", i) for i in other}
+
+    def union(self, other):
+        """Ids of self, then ids of other not in self"""
+        other_ids = other.ids if isinstance(other, IdCollection) else [getattr(i, "Id", i) for i in other]
+        return self._new(self.ids + [i for i in dict.fromkeys(other_ids) if i not in self._ids_set])
+
+    def intersection(self, other):
+        other_ids = self._ids_of(other)
+        return self._new([i for i in self.ids if i in other_ids])
+
+    def difference(self, other):
+        other_ids = self._ids_of(other)
+        return self._new([i for i in self.ids if i not in other_ids])
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    def filter(self, criteria):
+        """criteria is a callable acces -> bool"""
+        return self._new([i for i in self.ids if criteria(self.acces_class(self.base, i))])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, Id):
+        return Id in self._ids_set
+
+    def __iter__(self):
+        return (self.acces_class(self.base, i) for i in self.ids)
+
+    def __getitem__(self, row):
+        """Acces at row, or IdCollection for a slice"""
+        if isinstance(row, slice):
+            return self._new(self.ids[row])
+        return self.acces_class(self.base, self.ids[row])
+
+    def get_info(self, key=None, Id=None):
+        return {}
+
+    def index_from_id(self, Id):
+        try:
+            return self.ids.index(Id)
+        except ValueError:
+            return
+
+    def __repr__(self):
+        return f"IdCollection of {getattr(self.acces_class, '__name__', None)} : {self.ids}"
+
+
+class PagedCollection(Collection):
+    """Collection loading its acces by pages, on demand.
+    Only loaded acces are seen by list methods (len, sort, recherche, ...).
+    `fetch_page` is a callable (last_key, page_size) -> list of acces, where `last_key` is None for the first page,
+    and then `key` of the last acces loaded.
+    """
+
+    def __init__(self, fetch_page, page_size=200, key=lambda acces: acces.Id):
+        super().__init__()
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.key = key
+        self.exhausted = False
+        self._last_key = None
+
+    def next_page(self):
+        """Fetch the next page, without adding it. Returns a list of acces."""
+        if self.exhausted:
+            return []
+        page = self.fetch_page(self._last_key, self.page_size)
+        if len(page) < self.page_size:
+            self.exhausted = True
+        if page:
+            self._last_key = self.key(page[-1])
+        return page
+
+    def add_page(self, page):
+        for acces in page:
+            self._index[acces.Id] = len(self)
+            list.append(self, acces)
+
+    def fetch_more(self):
+        """Load the next page. Returns the number of acces added"""
+        page = self.next_page()
+        self.add_page(page)
+        return len(page)
+
+    def reset_pages(self):
+        """Forget loaded acces. The next page will be the first one."""
+        self.clear()
+        self.exhausted = False
+        self._last_key = None
+
+    def iter_all(self):
+        """Iterate over all acces, loading pages as needed"""
+        i = 0
+        while True:
+            while i < len(self):
+                yield self[i]
+                i += 1
+            if not self.fetch_more():
+                return
+
+
+class SortedView(PagedCollection):
+    """Sorted view over a large sequence of items, materialized (as acces) by pages.
+    Sorting on one field builds a heap of the sort keys (O(n)), and each page pops its items from it
+    (O(k log n) for k loaded rows), instead of sorting everything.
+
+    :param source: Sequence of items (ids for example)
+    :param materialize: Callable item -> acces. Default to identity
+    :param value: Callable (item, attribut) -> value, used to sort. Default to item[attribut]
+    """
+
+    def __init__(self, source, materialize=None, value=None, page_size=200):
+        self.source = list(source)
+        self.materialize = materialize or (lambda item: item)
+        self.value = value or (lambda item, attribut: item[attribut])
+        self._heap = None  # (heap of (key, index in source), reverse) of a pending partial sort
+        self._selected = []  # indexes in source of the items already popped from the heap, in order
+        self._consumed = 0  # number of source items already fetched (loaded acces may have been removed since)
+        super().__init__(self._fetch_page, page_size)
+
+    def reset_pages(self):
+        super().reset_pages()
+        self._consumed = 0
+
+    def _fetch_page(self, last_key, size):
+        start, stop = self._consumed, self._consumed + size
+        if start >= len(self.source):
+            return []
+        if self._heap is not None:
+            heap, reverse = self._heap
+            while len(self._selected) < stop and heap:
+                entry = heapq.heappop(heap)
+                self._selected.append(entry.keys[1] if reverse else entry[1])
+            if not heap:  # fully sorted
+                self.source = [self.source[i] for i in self._selected]
+                self._heap, self._selected = None, []
+            else:
+                items = [self.source[i] for i in self._selected[start:stop]]
+        if self._heap is None:
+            items = self.source[start:stop]
+        self._consumed += len(items)
+        return [self.materialize(item) for item in items]
+
+    def _key(self, attribut):
+        return self._sort_key_function(attribut, lambda item: self.value(item, attribut))
+
+    def sort_multi(self, criteres):
+        """Sorting on one field computes the sort keys once, and only the loaded pages are selected.
+        Sorting on several fields sorts the whole source."""
+        self._heap, self._selected = None, []
+        if len(criteres) == 1:
+            attribut, order = criteres[0]
+            key = self._key(attribut)
+            if order:  # ties keep the source order, as a stable sort
+                heap = [_OrderKey((key(item), i), (True, False)) for i, item in enumerate(self.source)]
+            else:
+                heap = [(key(item), i) for i, item in enumerate(self.source)]
+            heapq.heapify(heap)
+            self._heap = (heap, order)
+        else:
+            for attribut, order in reversed(criteres):
+                self.source.sort(key=self._key(attribut), reverse=order)
+        self.reset_pages()
+        self.fetch_more()
@@ -2,12 +2,19 @@
     - local DB accessed with SQLite
     - remote DB accessed with PostgreSQL
 """
+import bisect
+import asyncio
+import collections
+import concurrent.futures
 import datetime
+import functools
 import json
 import logging
 import os
 import re
 import sqlite3
+import threading
+import time
 
 try:
     import psycopg2
@@ -20,8 +27,33 @@ from . import formats
 from . import ConnexionError, StructureError
 
 
-def init_module(remote_credences=None,local_path=None):
-    """Connnexion informations : remote_credences for remote acces OR local_path for local access"""
+LOCAL_PROFILES = {
+    "default": {},
+    "performance": {"journal_mode": "WAL", "synchronous": "NORMAL", "cache_size": -64000,
+                    "mmap_size": 268435456, "temp_store": "MEMORY"},
+}
+"""SQLite pragmas applied on connect. `performance` allows concurrent readers and faster writes."""
+
+
+QUERY_CACHE = None
+"""Optionnal QueryCache used by MonoExecutant and Executant"""
+
+INSTRUMENTATION = None
+"""Optionnal Instrumentation collecting timings of connexions and requests"""
+
+
+def init_module(remote_credences=None,local_path=None,local_profile="default",cache_size=0,
+                slow_query_threshold=None,replica_path=None):
+    """Connnexion informations : remote_credences for remote acces OR local_path for local access.
+    local_profile is a name of LOCAL_PROFILES or a dict of pragmas.
+    replica_path is the directory of the local SQLite replica of the remote DB (see ReplicaConnexion)
+    If cache_size is not 0, SELECT results are cached (see QueryCache).
+    If slow_query_threshold (in seconds) is given, requests are timed and slow ones are logged (see Instrumentation)."""
+    global QUERY_CACHE, INSTRUMENTATION
+    QUERY_CACHE = QueryCache(cache_size) if cache_size else None
+    ReplicaConnexion.PATH = replica_path
+    LocalConnexion.PRAGMAS = LOCAL_PROFILES[local_profile] if isinstance(local_profile, str) else local_profile
+    INSTRUMENTATION = Instrumentation(slow_query_threshold) if slow_query_threshold is not None else None
     if remote_credences is not None:
         RemoteConnexion.HOST = remote_credences["DB"]["host"]
         RemoteConnexion.USER = remote_credences["DB"]["user"]
@@ -40,25 +72,159 @@ def init_module(remote_credences=None,local_path=None):
     logging.info(f"Sql module initialized with {MonoExecutant.ConnectionClass.__name__}")
 
 
+class QueryCache:
+    """LRU cache of SELECT results, keyed by (request, args).
+    Entries are invalidated by table when a write request (INSERT, UPDATE, DELETE) is executed.
+    Modifications made by other clients are not detected : `invalidate` should be called on refresh.
+    Each invalidation increments generation counters : results read while their tables were invalidated
+    (by concurrent writes) are not stored.
+    """
+
+    REGEXP_READ = re.compile(r"^\s*SELECT", flags=re.I)
+    REGEXP_READ_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)", flags=re.I)
+    REGEXP_WRITE_TABLE = re.compile(r"^\s*(?:INSERT INTO|UPDATE|DELETE FROM)\s+(\w+)", flags=re.I)
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()  # key -> (tables, result)
+        self.hits = self.misses = 0
+        self._lock = threading.RLock()  # requests may be run from several threads
+        self.generations = collections.defaultdict(int)  # table -> number of invalidations
+        self.generation = 0  # number of invalidations of all entries
+
+    def _key(self, req, args):
+        """Return a hashable key for a read request, None otherwise"""
+        if not self.REGEXP_READ.match(req):
+            return None
+        if isinstance(args, dict):
+            args = tuple(sorted(args.items()))
+        key = (req, args)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _read_tables(self, req):
+        return frozenset(t.lower() for t in self.REGEXP_READ_TABLES.findall(req))
+
+    def _generation(self, tables):
+        with self._lock:
+            return self.generation, tuple(self.generations[t] for t in sorted(tables))
+
+    def _store(self, key, req, result, generation=None):
+        """Store result, unless tables read by req have been invalidated since `generation` (see _generation)"""
+        tables = self._read_tables(req)
+        with self._lock:
+            if generation is not None and generation != self._generation(tables):
+                return
+            self.entries[key] = (tables, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, table=None):
+        """Remove entries reading table, or all entries if table is None"""
+        with self._lock:
+            if table is None:
+                self.generation += 1
+                self.entries.clear()
+                return
+            table = table.lower()
+            self.generations[table] += 1
+            for key in [k for k, (tables, _) in self.entries.items() if table in tables]:
+                del self.entries[key]
+
+    def written_tables(self, requetes):
+        """Return the set of tables modified by the given requests"""
+        written = set()
+        for req, _ in requetes:
+            match = self.REGEXP_WRITE_TABLE.match(req)
+            if match:
+                written.add(match.group(1))
+        return written
+
+    def execute(self, requete_SQL, use_cache=True):
+        """Same as abstractConnexion.execute. If `use_cache`, results are read from cache, and stored.
+        Otherwise, the cache is bypassed (results are not stored either)."""
+        is_mono = isinstance(requete_SQL, tuple)
+        requetes = [requete_SQL] if is_mono else [r for r in requete_SQL if r]
+        keys = [self._key(*r) for r in requetes]
+        with self._lock:
+            if use_cache and all(k in self.entries for k in keys):
+                self.hits += 1
+                res = []
+                for k in keys:
+                    self.entries.move_to_end(k)
+                    res.append(list(self.entries[k][1]))
+                return res[0] if is_mono else res
+            self.misses += 1
+            generations = [self._generation(self._read_tables(req)) for req, _ in requetes]
+
+        written = self.written_tables(requetes)
+        try:
+            res = requete_SQL.ConnectionClass().execute(requete_SQL)
+        finally:
+            for table in written:
+                self.invalidate(table)
+        if use_cache and not written:  # reads mixed with writes are not stored
+            results = [res] if is_mono else res
+            for key, (req, _), result, generation in zip(keys, requetes, results, generations):
+                if key is not None:
+                    self._store(key, req, list(result), generation)
+        return res
+
+
 class MonoExecutant(tuple):
 
     ConnectionClass = None
 
-    def __call__(self):
+    def __call__(self, use_cache=True):
         if self:
+            if QUERY_CACHE is not None:
+                return QUERY_CACHE.execute(self, use_cache=use_cache)
             return self.ConnectionClass().execute(self)
         return []
 
+    async def run_async(self, use_cache=True):
+        """Awaitable version of __call__. The request is run in the executor of the connexion class."""
+        if self:
+            return await self.ConnectionClass.run_async(self, use_cache)
+        return []
+
 
 class Executant(list):
 
     ConnectionClass = None
 
-    def __call__(self):
+    def __call__(self, use_cache=True):
         if self:
+            if QUERY_CACHE is not None:
+                return QUERY_CACHE.execute(self, use_cache=use_cache)
             return self.ConnectionClass().execute(self)
         return []
 
+    async def run_async(self, use_cache=True, concurrent=False):
+        """Awaitable version of __call__.
+        If concurrent is True, sub-requests are run concurrently, each one in its own transaction.
+        They should then be independent."""
+        if not self:
+            return []
+        if concurrent:
+            jobs = (MonoExecutant(r).run_async(use_cache) for r in self if r)
+            return list(await asyncio.gather(*jobs))
+        return await self.ConnectionClass.run_async(self, use_cache)
+
+    def run_batch(self, chunk_size=100):
+        """Execute sub-requests committing every chunk_size sub-requests. A failing sub-request doesn't
+        cancel the others (see abstractConnexion.execute_batch). Returns a BatchResult."""
+        try:
+            return self.ConnectionClass().execute_batch(self, chunk_size=chunk_size)
+        finally:
+            if QUERY_CACHE is not None:
+                for table in QUERY_CACHE.written_tables(r for r in self if r):
+                    QUERY_CACHE.invalidate(table)
+
     def __bool__(self):
         return sum(bool(x) for x in self) >= 1
 
@@ -67,6 +233,120 @@ class Executant(list):
 
     __radd__ = __add__
 
+class BatchResult:
+    """Outcome of Executant.run_batch.
+    `results` has one element per sub-request (None if it failed), `failed` maps index of failed sub-requests to
+    the error message."""
+
+    def __init__(self, requetes):
+        self.requetes = list(requetes)
+        self.results = [None] * len(self.requetes)
+        self.failed = {}
+
+    def __bool__(self):
+        """True if all sub-requests succeeded"""
+        return not self.failed
+
+    def failed_requests(self):
+        """Return an Executant with only failed sub-requests, to retry them."""
+        return Executant(self.requetes[i] for i in sorted(self.failed))
+
+
+class TimingStats:
+    """Count, total, max and histogram of durations (in seconds)"""
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+    """Upper bounds of histogram buckets. The last bucket counts longer durations."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self.histogram = [0] * (len(self.BUCKETS) + 1)
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.histogram[bisect.bisect_left(self.BUCKETS, duration)] += 1
+
+    def to_dict(self):
+        mean = self.total / self.count if self.count else 0.
+        return {"count": self.count, "total": self.total, "mean": mean, "max": self.max,
+                "histogram": list(self.histogram)}
+
+
+class QueryStats:
+    """Timings of one normalized request"""
+
+    def __init__(self):
+        self.execute = TimingStats()
+        self.fetch = TimingStats()
+        self.rows = 0
+
+    def to_dict(self):
+        return {"execute": self.execute.to_dict(), "fetch": self.fetch.to_dict(), "rows": self.rows}
+
+
+class Instrumentation:
+    """Collects timings of connect, execute, fetch and commit.
+    Requests are aggregated by normalized text (literals replaced by ?).
+    Requests longer than `slow_threshold` are logged."""
+
+    REGEXP_LITERALS = re.compile(r"'[^']*'|\b\d+(?:\.\d+)?\b")
+    REGEXP_SPACES = re.compile(r"\s+")
+
+    def __init__(self, slow_threshold=0.5):
+        self.slow_threshold = slow_threshold
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connect = TimingStats()
+            self.commit = TimingStats()
+            self.queries = {}  # normalized request -> QueryStats
+
+    @classmethod
+    @functools.lru_cache(maxsize=1024)
+    def normalize(cls, req):
+        req = cls.REGEXP_LITERALS.sub("?", req)
+        return cls.REGEXP_SPACES.sub(" ", req).strip()
+
+    def record_connect(self, duration):
+        with self._lock:
+            self.connect.add(duration)
+
+    def record_commit(self, duration):
+        with self._lock:
+            self.commit.add(duration)
+
+    def record_request(self, req, duration_execute, duration_fetch, rows):
+        key = self.normalize(req)
+        with self._lock:
+            if key not in self.queries:
+                self.queries[key] = QueryStats()
+            stats = self.queries[key]
+            stats.execute.add(duration_execute)
+            stats.fetch.add(duration_fetch)
+            stats.rows += rows
+        duration = duration_execute + duration_fetch
+        if duration >= self.slow_threshold:
+            logging.warning(f"Slow SQL request ({duration:.3f} s, {rows} rows) : {key}")
+
+    def get_stats(self):
+        """Return a dict { `connect` : stats, `commit` : stats, `queries` : { request : stats } }"""
+        with self._lock:
+            queries = {key: stats.to_dict() for key, stats in self.queries.items()}
+            return {"connect": self.connect.to_dict(), "commit": self.commit.to_dict(), "queries": queries}
+
+    def slowest(self, n=10):
+        """Return the n normalized requests with the greatest total time, as (request, stats)"""
+        queries = self.get_stats()["queries"]
+        key = lambda item: item[1]["execute"]["total"] + item[1]["fetch"]["total"]
+        return sorted(queries.items(), key=key, reverse=True)[:n]
+
+
 class abstractConnexion:
     """Base class for the two connexions classes.
     Wraps real SQL connexion object."""
@@ -80,17 +360,38 @@ class abstractConnexion:
     DEV_MODE = False
     """Default value for dev base acces"""
 
+    ASYNC_WORKERS = 4
+    """Number of threads used to run requests from asyncio (see run_async)"""
+
     def __init__(self, DSN, autocommit, dev=None, **kwargs):
         DSN = DSN.format(self._get_base_name(dev))
 
+        start = time.perf_counter()
         try:
             connexion = self.SQL.connect(DSN,**kwargs)
         except self.SQL.Error as e:
             raise ConnexionError(f"Impossible de se connecter à la base de données distante. Details : {e}")
         else:
+            if INSTRUMENTATION is not None:
+                INSTRUMENTATION.record_connect(time.perf_counter() - start)
             self.connexion = connexion
             self.set_autocommit(autocommit)
 
+    @classmethod
+    def _get_executor(cls):
+        # one executor per connexion class
+        if cls.__dict__.get("_executor") is None:
+            cls._executor = concurrent.futures.ThreadPoolExecutor(max_workers=cls.ASYNC_WORKERS,
+                                                                  thread_name_prefix=cls.__name__)
+        return cls._executor
+
+    @classmethod
+    async def run_async(cls, job, *args):
+        """Run job(*args) in the executor of the class and return its result.
+        Blocking connexion and execution don't block the event loop, and at most ASYNC_WORKERS jobs run at once."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls._get_executor(), job, *args)
+
     def _get_base_name(self, dev):
         # If dev is asked, use basename_dev
         if dev is None:
@@ -105,14 +406,18 @@ class abstractConnexion:
         raise NotImplementedError
 
     def _execute_one(self,cursor,req,args):
+        start = time.perf_counter()
         cursor.execute(req,args)
+        executed = time.perf_counter()
         try:
-            return cursor.fetchall()
+            res = cursor.fetchall()
         except self.SQL.ProgrammingError as e:
-            if str(e) == "no results to fetch":
-                return []
-            logging.exception("SQL Programming Error :")
-            return []
+            if str(e) != "no results to fetch":
+                logging.exception("SQL Programming Error :")
+            res = []
+        if INSTRUMENTATION is not None:
+            INSTRUMENTATION.record_request(req, executed - start, time.perf_counter() - executed, len(res))
+        return res
 
     def execute(self, requete_SQL):
         """Execute one or many requests
@@ -132,16 +437,63 @@ class abstractConnexion:
         except self.SQL.Error as e:
             raise StructureError(f"SQL error ! Details : \n {e}")
         else:
+            start = time.perf_counter()
             self.connexion.commit()
+            if INSTRUMENTATION is not None:
+                INSTRUMENTATION.record_commit(time.perf_counter() - start)
         finally:
             self.connexion.close()
         return res
 
+    def _begin(self, cursor):
+        """Start a transaction, if the driver doesn't do it implicitly"""
+        pass
+
+    def execute_batch(self, requetes, chunk_size=100):
+        """Execute a list of requests, committing every chunk_size requests.
+        Each request runs in a savepoint : on failure, only this request is rolled back.
+
+        :return: BatchResult
+        """
+        batch = BatchResult(requetes)
+        try:
+            cursor = self.cursor()
+            for start in range(0, len(batch.requetes), chunk_size):
+                indexes = range(start, min(start + chunk_size, len(batch.requetes)))
+                self._begin(cursor)
+                for i in indexes:
+                    r = batch.requetes[i]
+                    if not r:
+                        batch.results[i] = []
+                        continue
+                    cursor.execute("SAVEPOINT batch_request")
+                    try:
+                        batch.results[i] = self._execute_one(cursor, *r)
+                    except self.SQL.Error as e:
+                        cursor.execute("ROLLBACK TO SAVEPOINT batch_request")
+                        batch.failed[i] = str(e)
+                    cursor.execute("RELEASE SAVEPOINT batch_request")
+                try:
+                    self.connexion.commit()
+                except self.SQL.Error as e:  # the whole chunk is lost
+                    self.connexion.rollback()
+                    for i in indexes:
+                        if i not in batch.failed:
+                            batch.results[i] = None
+                            batch.failed[i] = str(e)
+        except self.SQL.Error as e:
+            raise StructureError(f"SQL error ! Details : \n {e}")
+        finally:
+            self.connexion.close()
+        if batch.failed:
+            logging.warning(f"{len(batch.failed)} requests failed in batch of {len(batch.requetes)}.")
+        return batch
+
     def close(self):
         self.connexion.close()
 
 sqlite3.register_converter("json",lambda s : json.loads(s,object_hook=formats.date_decoder))
-sqlite3.register_adapter(list,lambda l : json.dumps(l,cls=formats.JsonEncoder))
+sqlite3.register_adapter(list,formats.json_dumps)
 sqlite3.register_converter("list",lambda s : json.loads(s,object_hook=formats.date_decoder))
 
 class LocalConnexion(abstractConnexion):
@@ -156,16 +508,45 @@ class LocalConnexion(abstractConnexion):
 
     REGEXP_TABLE = re.compile(r"(INSERT INTO|UPDATE)\s*(\w*)", flags=re.I)
     REGEXP_ID = re.compile(r"id =\s*(\w*)", flags=re.I)
+    REGEXP_RETURNING = re.compile(r"RETURNING \*", flags=re.I)
+
+    NATIVE_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+    """SQLite supports RETURNING since 3.35. Otherwise, it's emulated with a second request."""
+
+    PRAGMAS = {}
+    """Pragmas executed on connect (see LOCAL_PROFILES)"""
+
+    ASYNC_WORKERS = 1
+    """SQLite allows one writer : requests are run in a dedicated thread"""
+
+    PRAGMAS_ORDER = ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store")
+    """Pragmas applied first, in this order. Others are applied afterwards."""
 
     def __init__(self, autocommit=False, dev=None):
         DSN = os.path.join(self.PATH, "{}.sqlite")
         super().__init__(DSN, autocommit, dev, detect_types=self.SQL.PARSE_DECLTYPES)
+        self._apply_pragmas()
+
+    def _apply_pragmas(self):
+        # journal_mode should be set first
+        names = [name for name in self.PRAGMAS_ORDER if name in self.PRAGMAS]
+        names += [name for name in self.PRAGMAS if name not in self.PRAGMAS_ORDER]
+        for name in names:
+            if not name.isidentifier():
+                raise ValueError(f"Invalid pragma name : {name}")
+            self.connexion.execute(f"PRAGMA {name} = {self.PRAGMAS[name]}")
 
     def set_autocommit(self,autocommit):
         pass
 
+    @classmethod
+    @functools.lru_cache(maxsize=1024)
+    def _emulate_returning(cls, req):
+        """Return True if RETURNING has to be emulated for req. Cached per request text."""
+        return not cls.NATIVE_RETURNING and bool(cls.REGEXP_RETURNING.search(req))
+
     def _execute_one(self,cursor,req : str,args):
-        if re.search(r"RETURNING \*", req, flags=re.I):
+        if self._emulate_returning(req):
             req = req.replace("RETURNING *","")
             super()._execute_one(cursor,req,args) # no intersting result so far
             match = self.REGEXP_TABLE.search(req)
@@ -178,11 +559,24 @@ class LocalConnexion(abstractConnexion):
             return cursor.fetchall()
         return super(LocalConnexion, self)._execute_one(cursor,req,args)
 
+    def _begin(self, cursor):
+        # explicit transaction : otherwise, releasing a savepoint would commit
+        cursor.execute("BEGIN")
+
     def cursor(self):
         self.connexion.row_factory = sqlite3.Row
         return self.connexion.cursor()
 
 
+class ReplicaConnexion(LocalConnexion):
+    """Connexion to the local SQLite replica of the remote DB (see data_model.abstractBase.sync_replica).
+    Used alongside RemoteConnexion."""
+
+    PATH = None
+
+    NAME = "replica"
+
+
 psycopg2.extras.register_default_json(loads=lambda s: json.loads(s,object_hook=formats.date_decoder), globally=True)
 psycopg2.extras.register_default_jsonb(loads=lambda s: json.loads(s,object_hook=formats.date_decoder), globally=True)
 
@@ -197,6 +591,8 @@ class RemoteConnexion(abstractConnexion):
     PASSWORD = ""
     NAME = ""
 
+    ASYNC_WORKERS = 16
+
     def __init__(self, autocommit=False, dev=None):
         DSN = "host={} user={} password={} dbname={{}}".format(self.HOST, self.USER, self.PASSWORD)
         super().__init__(DSN, autocommit, dev)
@@ -206,16 +602,45 @@ class RemoteConnexion(abstractConnexion):
 
 
 
-def cree_local_DB(scheme):
+CHANGE_LOG_TABLE = "change_log"
+"""Table recording modifications of the local DB (see cree_local_DB)"""
+
+CHANGE_LOG_OPS = ("INSERT", "UPDATE", "DELETE")
+
+
+def _change_log_triggers(table):
+    req = ""
+    for op in CHANGE_LOG_OPS:
+        row = "OLD" if op == "DELETE" else "NEW"
+        req += f"""CREATE TRIGGER {table}_log_{op.lower()} AFTER {op} ON {table} BEGIN
+            INSERT INTO {CHANGE_LOG_TABLE} (table_name, row_id, op) VALUES ('{table}', {row}.id, '{op}') ; END ;"""
+    return req
+
+
+def cree_local_DB(scheme, indexes=None, change_log=False, connexion_class=None):
     """Create emmpt DB according to the given scheme : dict { table : [ (column_name, column_type), .. ]}
+    indexes is an optionnal dict { table : [ column_name or (column_name, ..), .. ] }
+    If change_log is True, modifications of tables with an `id` column are recorded by triggers (see poll_changes).
+    connexion_class defaults to LocalConnexion.
     Usefull at installation of application (and for developement)
     """
-    conn = LocalConnexion()
+    conn = (connexion_class or LocalConnexion)()
+    indexes = indexes or {}
     req = ""
+    if change_log:
+        req += f"DROP TABLE IF EXISTS {CHANGE_LOG_TABLE};"
+        req += f"""CREATE TABLE {CHANGE_LOG_TABLE} ( seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name text, row_id integer, op text ) ;"""
     for table, fields in scheme.items():
         req += f"DROP TABLE IF EXISTS {table};"
         req_fields = ", ".join(f'{c_name} {c_type}' for c_name, c_type in fields)
         req += f"""CREATE TABLE {table} (  {req_fields} ) ;"""
+        for columns in indexes.get(table, ()):
+            columns = (columns,) if isinstance(columns, str) else tuple(columns)
+            name = f"idx_{table}_" + "_".join(columns)
+            req += f"""CREATE INDEX {name} ON {table} ( {", ".join(columns)} ) ;"""
+        if change_log and "id" in (c_name for c_name, _ in fields):
+            req += _change_log_triggers(table)
     cur = conn.cursor()
     cur.executescript(req)
     conn.connexion.commit()
@@ -223,17 +648,60 @@ def cree_local_DB(scheme):
     logging.info("Database created with succes.")
 
 
+def poll_changes(since=0):
+    """Change-feed of the local DB, created with change_log=True.
+    Only the resulting operation on each row is kept (a row inserted then updated is reported as inserted,
+    a row inserted then deleted is omitted, a row deleted then inserted is reported as updated).
+
+    :param since: Last sequence number already seen
+    :return: new sequence number, dict { table : { id : op } } with op in CHANGE_LOG_OPS
+    """
+    req = f"SELECT seq, table_name, row_id, op FROM {CHANGE_LOG_TABLE} WHERE seq > ? ORDER BY seq"
+    rows = LocalConnexion().execute((req, (since,)))
+    changes = {}
+    for seq, table, Id, op in rows:
+        ops = changes.setdefault(table, {})
+        previous = ops.get(Id)
+        if previous == "INSERT" and op == "DELETE":
+            del ops[Id]
+        elif previous == "DELETE" and op == "INSERT":
+            ops[Id] = "UPDATE"
+        elif previous != "INSERT":
+            ops[Id] = op
+        since = seq
+    return since, changes
+
+
+def purge_changes(until):
+    """Remove change log entries with sequence number up to `until` (included)"""
+    LocalConnexion().execute((f"DELETE FROM {CHANGE_LOG_TABLE} WHERE seq <= ?", (until,)))
+
+
 
 
 class abstractRequetesSQL():
     """Functions to build requests. To actually execute them, call them.
     The syntax is compliant with PostgreSQL standards, but it can be as well used with SQLite.
-    To support the RETURNING operation, the resquest is replaced at execution by two requests, the later selecting and returning the data. This is only possible if RETURNING * is at the end of the requests !
+    RETURNING is natively supported by SQLite 3.35+. With older versions, the resquest is replaced at execution by two requests, the later selecting and returning the data. This is only possible if RETURNING * is at the end of the requests !
     """
 
     mark_style = named_style = ""
 
-    TYPES_PERMIS = [list, int, float, str, bool, type(None), datetime.date, datetime.datetime]
+    TYPES_PERMIS = {list, int, float, str, bool, type(None), datetime.date, datetime.datetime}
+
+    JSON_DUMPS = staticmethod(formats.json_dumps)
+    """Codec used by jsonise for other types"""
+
+    CHUNK_SIZE = 500
+    """Maximum number of rows (or values) per statement for bulk operations"""
+
+    MAX_PARAMS = {"%s": 65535, "?": 999}
+    """Maximum number of bound parameters per statement, by mark style (999 for SQLite < 3.32)"""
+
+    @classmethod
+    def _chunk_size(cls, params_per_row):
+        """Number of rows per statement, within CHUNK_SIZE and MAX_PARAMS"""
+        return max(1, min(cls.CHUNK_SIZE, cls.MAX_PARAMS.get(cls.mark_style, 999) // params_per_row))
 
     @classmethod
     def setup_marks(cls,mode):
@@ -260,12 +728,13 @@ class abstractRequetesSQL():
         """Renvoie un dictionnaire dont les champs dont compatibles avec SQL
         Utilise Json. Attention à None : il faut laisser None et non pas null"""
         d = {}
+        permis, dumps = abstractRequetesSQL.TYPES_PERMIS, abstractRequetesSQL.JSON_DUMPS
         for k, v in dic.items():
-            if type(v) in abstractRequetesSQL.TYPES_PERMIS:
+            if type(v) in permis:
                 d[k] = v
             else:
                 try:
-                    d[k] = json.dumps(v, ensure_ascii=False, cls=formats.JsonEncoder)
+                    d[k] = dumps(v)
                 except ValueError as e:
                     logging.exception("Erreur d'encodage JSON !")
                     raise e
@@ -328,6 +797,37 @@ class abstractRequetesSQL():
         l = [ (f"SELECT * FROM {t}" , {} )  for t in liste_table]
         return Executant(l)
 
+    @classmethod
+    def load_data_since(cls, table, field, since, champ_id="id"):
+        """Incremental loading : rows modified since `since` (included) and ids of all rows, to detect deletions.
+
+        :param table: Safe table name
+        :param field: Safe name of the modification date field
+        :return: Executant of two requests
+        """
+        l = [(f"SELECT * FROM {table} WHERE {field} >= {cls.mark_style}", (since,)),
+             (f"SELECT {champ_id} FROM {table}", ())]
+        return Executant(l)
+
+
+    @classmethod
+    def load_page(cls, table, last=None, limit=100, field=None, champ_id="id"):
+        """ Keyset pagination : rows following `last`, ordered by champ_id or by (field, champ_id).
+
+        :param table: Safe table name
+        :param last: None for the first page, otherwise the key of the last row of the previous page :
+            its id, or a tuple (field value, id) if field is given
+        :param field: Safe name of an indexed, not null column
+        :return: MonoExecutant
+        """
+        order = champ_id if field is None else f"{field}, {champ_id}"
+        if last is None:
+            return MonoExecutant((f"SELECT * FROM {table} ORDER BY {order} LIMIT {int(limit)}", ()))
+        if field is None:
+            where, args = f"{champ_id} > {cls.mark_style}", (last,)
+        else:
+            where, args = f"({field}, {champ_id}) > ({cls.mark_style}, {cls.mark_style})", tuple(last)
+        return MonoExecutant((f"SELECT * FROM {table} WHERE {where} ORDER BY {order} LIMIT {int(limit)}", args))
 
     @classmethod
     def supprime(cls,table, **kwargs):
@@ -340,6 +840,54 @@ class abstractRequetesSQL():
         args = (value,)
         return MonoExecutant((req, args))
 
+    @classmethod
+    def supprime_many(cls, table, field, values):
+        """ Remove entries whose field is in values, with one statement per CHUNK_SIZE values (at most).
+
+        :param table: Safe table name
+        :param field: Safe column name
+        """
+        values = list(values)
+        if cls.mark_style == "%s":  # PostgreSQL adapts lists to arrays
+            l = [(f"DELETE FROM {table} WHERE {field} = ANY(%s)", (values[i:i + cls.CHUNK_SIZE],))
+                 for i in range(0, len(values), cls.CHUNK_SIZE)]
+        else:
+            l = []
+            size = cls._chunk_size(1)
+            for i in range(0, len(values), size):
+                chunk = values[i:i + size]
+                marks = ",".join(cls.mark_style for _ in chunk)
+                l.append((f"DELETE FROM {table} WHERE {field} IN ({marks})", tuple(chunk)))
+        return Executant(l)
+
+    @classmethod
+    def upsert_many(cls, table, rows, key="id"):
+        """ Insert rows, or update existing ones (conflicting on key), with one statement per CHUNK_SIZE rows (at most,
+        the number of bound parameters being limited by MAX_PARAMS).
+
+        :param table: Safe table name
+        :param rows: List of dicts, sharing the same fields
+        :param key: Field name (or tuple of names) with unique constraint
+        """
+        rows = [abstractRequetesSQL.jsonise(r) for r in rows if r]
+        if not rows:
+            return Executant()
+        fields = list(rows[0])
+        key = (key,) if isinstance(key, str) else tuple(key)
+        # a statement can't update a row twice : the last row wins
+        rows = list({tuple(r[k] for k in key): r for r in rows}.values())
+        updates = ", ".join(f"{f} = EXCLUDED.{f}" for f in fields if f not in key)
+        action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        row_marks = "(" + ",".join(cls.mark_style for _ in fields) + ")"
+        l = []
+        size = cls._chunk_size(len(fields))
+        for i in range(0, len(rows), size):
+            chunk = rows[i:i + size]
+            values = ",".join(row_marks for _ in chunk)
+            req = f"""INSERT INTO {table} ({",".join(fields)}) VALUES {values} ON CONFLICT ({",".join(key)}) {action}"""
+            l.append((req, tuple(r[f] for r in chunk for f in fields)))
+        return Executant(l)
+
     @staticmethod
     def get_users():
         return MonoExecutant(("SELECT * FROM users", ()))
@@ -350,3 +898,8 @@ class abstractRequetesSQL():
         return MonoExecutant((r, (id_user, mdp)))
 
 
+class LocalRequetesSQL(abstractRequetesSQL):
+    """Requests for the local SQLite DB, whatever the mode of the module (see ReplicaConnexion)"""
+
+    mark_style = "?"
+    named_style = ":{}"
@@ -135,14 +135,54 @@ class abstractModel(QAbstractTableModel):
             self.sort_state = (section, True)
         self.endResetModel()
 
-    # TODO: Enhance remove line
+    def sort_multi(self, criteres):
+        """Stable sort on several columns. criteres is a list of (section, order), by decreasing priority"""
+        self.beginResetModel()
+        self.collection.sort_multi([(self.header[section], order) for section, order in criteres])
+        self.sort_state = criteres[0] if criteres else (-1, False)
+        self.endResetModel()
+
+    def canFetchMore(self, parent=None):
+        """Paged collections (see groups.PagedCollection) are loaded as the view scrolls"""
+        return not getattr(self.collection, "exhausted", True)
+
+    def fetchMore(self, parent=None):
+        page = self.collection.next_page()
+        if page:
+            first = len(self.collection)
+            self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+            self.collection.add_page(page)
+            self.endInsertRows()
+
+    def insert_item(self, item):
+        """Insert item at its sorted position if the collection maintains its order (see groups.sortableListe),
+        at the end otherwise. Emit rowsInserted signal"""
+        row = self.collection.insert_position(item)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.collection.insert_at(row, item)
+        self.endInsertRows()
+        return row
+
+    def item_changed(self, row):
+        """Should be called when data of item at row has changed.
+        Moves the row if the collection maintains its order, and emit dataChanged signal"""
+        new_row = self.collection.reposition_target(row)
+        if new_row != row:
+            # destination is given relatively to rows before the move
+            dest = new_row + 1 if new_row > row else new_row
+            self.beginMoveRows(QModelIndex(), row, row, QModelIndex(), dest)
+            self.collection.move(row, new_row)
+            self.endMoveRows()
+        self.dataChanged.emit(self.index(new_row, 0), self.index(new_row, self.columnCount() - 1))
+        return new_row
+
     def remove_line(self, section):
         """Base implementation just pops the item from collection.
         Re-implements to add global behaviour
         """
-        self.beginResetModel()
+        self.beginRemoveRows(QModelIndex(), section, section)
         self.collection.pop(section)
-        self.endResetModel()
+        self.endRemoveRows()
 
     def _update(self):
         """Emit dataChanged signal on all cells"""
@@ -196,8 +236,8 @@ class InternalDataModel(abstractModel):
         """
         row = index.row() if hasattr(index, "row") else index
         self.collection[row] = new_item
-        self.dataChanged.emit(self.index(
-            row, 0), self.index(row, self.rowCount() - 1))
+        self.collection.invalidate_sort_keys()
+        self.item_changed(row)
 
 
 class ExternalDataModel(abstractModel):
@@ -221,11 +261,14 @@ class ExternalDataModel(abstractModel):
             "ExternalDataModel does not own it's collection !")
 
     def set_data(self, index, value):
-        """Uses given data setter, and emit modelReset signal"""
+        """Uses given data setter. Moves the row in order-maintaining mode, emit modelReset signal otherwise"""
         acces, field = self.get_item(index), self.header[index.column()]
-        self.beginResetModel()
         self.set_data_hook(acces, field, value)
-        self.endResetModel()
+        self.collection.invalidate_sort_keys(getattr(acces, "Id", None))
+        if self.collection.is_ordered:
+            self.item_changed(index.row())
+        else:
+            self._reset()
 
 
 class MultiSelectModel(InternalDataModel):
@@ -740,9 +783,7 @@ class abstractMutableList(QFrame):
         return v
 
     def on_add(self, item):
-        self.view.model().beginResetModel()
-        self.view.model().collection.append(item)
-        self.view.model().endResetModel()
+        self.view.model().insert_item(item)
 
     def set_data(self, collection):
         self.view.model().set_collection(collection)